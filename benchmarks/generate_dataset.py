@@ -0,0 +1,129 @@
+"""Generate a synthetic arXiv-like dataset for benchmarking the publication ETL.
+
+Records follow the schema of the arXiv metadata snapshot and are written as
+JSON lines (gzip compressed when the output ends in .gz). Author and category
+popularity follow a Zipf distribution so that id caches and joins see the same
+kind of skew as on the real snapshot. The output only depends on the seed.
+
+    python benchmarks/generate_dataset.py --scale 1m --output bench_1m.jsonl.gz
+"""
+import argparse
+import bisect
+import gzip
+import itertools
+import json
+import random
+from datetime import date, timedelta
+
+scales = {
+    '10k': 10_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+
+category_codes = [
+    'hep-ph', 'quant-ph', 'cs.LG', 'astro-ph', 'hep-th', 'cond-mat.mes-hall', 'math.CO', 'cs.CV',
+    'gr-qc', 'cond-mat.str-el', 'math.AP', 'cs.AI', 'physics.optics', 'math.PR', 'cond-mat.stat-mech',
+    'cs.CL', 'math-ph', 'math.MP', 'stat.ML', 'cond-mat.mtrl-sci', 'nucl-th', 'math.NT', 'cs.IT',
+    'math.IT', 'math.AG', 'cs.DS', 'astro-ph.GA', 'physics.flu-dyn', 'math.DG', 'cs.CG', 'cs.DB',
+    'q-bio.PE', 'econ.TH', 'math.OC', 'stat.ME', 'physics.gen-ph', 'nlin.CD', 'cs.CR', 'eess.SP',
+    'q-fin.ST',
+]
+
+first_names = [
+    'Ileana', 'Louis', 'Hongjun', 'David', 'Alberto', 'Wael', 'Yue', 'Maria', 'Pavel', 'Sofia',
+    'Kenji', 'Amara', 'Lucas', 'Nadia', 'Oliver', 'Priya', 'Rafael', 'Elena', 'Tomasz', 'Chen',
+    'Fatima', 'Jonas', 'Aisha', 'Mateo', 'Ingrid', 'Hiroshi', 'Zoe', 'Arjun', 'Leila', 'Viktor',
+]
+
+last_names = [
+    'Streinu', 'Theran', 'Pan', 'Callan', 'Torchinsky', 'Abu-Shammala', 'Yu', 'Garcia', 'Novak',
+    'Rossi', 'Tanaka', 'Okafor', 'Silva', 'Haddad', 'Smith', 'Iyer', 'Moreno', 'Petrova', 'Kowalski',
+    'Wang', 'Rahman', 'Berg', 'Bello', 'Fernandez', 'Larsen', 'Sato', 'Dubois', 'Patel', 'Karimi',
+    'Ivanov', 'Schmidt', 'Nguyen', 'Kim', 'Lopez', 'Muller', 'Cohen', 'Ali', 'Jensen', 'Costa', 'Ward',
+]
+
+words = (
+    'graph sparse decomposition quantum field theory lattice gauge boson spectrum dynamics '
+    'algorithm learning neural network stochastic process manifold operator entropy symmetry '
+    'estimation inference convergence boundary equation nonlinear optical cavity magnetic '
+    'topological phase transition dark matter galaxy cluster redshift kernel regression '
+    'embedding transformer convex optimization random walk percolation invariant curvature'
+).split()
+
+
+def zipf_cum_weights(count, exponent):
+    return list(itertools.accumulate(1.0 / (rank + 1) ** exponent for rank in range(count)))
+
+
+def pick(rng, population, cum_weights):
+    return population[bisect.bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+
+def make_author(index):
+    """Deterministic author name for a pool index."""
+    first = first_names[index % len(first_names)]
+    # Offsetting by the quotient keeps the mapping one-to-one while spreading surnames
+    quotient = index // len(first_names)
+    last = last_names[(quotient + index) % len(last_names)]
+    suffix = index // (len(first_names) * len(last_names))
+    return (last + (f"-{suffix}" if suffix else ''), first)
+
+
+def generate_records(count, seed=0):
+    rng = random.Random(seed)
+    author_pool = range(max(count // 3, 100))
+    author_weights = zipf_cum_weights(len(author_pool), exponent=0.6)
+    category_weights = zipf_cum_weights(len(category_codes), exponent=0.9)
+    start = date(2007, 4, 1)
+
+    for index in range(count):
+        created = start + timedelta(days=index * 5000 // count)
+        authors = {make_author(pick(rng, author_pool, author_weights)) for _ in range(rng.randint(1, 6))}
+        authors_parsed = [[last, first, ''] for last, first in sorted(authors)]
+        names = [f"{first} {last}" for last, first, _ in authors_parsed]
+        categories = list(dict.fromkeys(pick(rng, category_codes, category_weights) for _ in range(rng.randint(1, 3))))
+        versions = [
+            {'version': f"v{number + 1}",
+             'created': (created + timedelta(days=30 * number)).strftime('%a, %d %b %Y 00:00:00 GMT')}
+            for number in range(rng.choice([1, 1, 1, 2, 2, 3]))
+        ]
+        updated = created + timedelta(days=30 * (len(versions) - 1))
+
+        yield {
+            'id': f"{created:%y%m}.{index:07d}",
+            'submitter': names[0],
+            'authors': ', '.join(names[:-1]) + (' and ' if len(names) > 1 else '') + names[-1],
+            'title': ' '.join(rng.choice(words) for _ in range(rng.randint(4, 12))).capitalize() + f" {index}",
+            'comments': f"{rng.randint(5, 40)} pages, {rng.randint(0, 9)} figures" if rng.random() < 0.7 else None,
+            'journal-ref': f"Stub Journal {rng.randint(1, 80)} ({updated.year}) {rng.randint(1, 999)}" if rng.random() < 0.3 else None,
+            'doi': f"10.5555/bench.{index}" if rng.random() < 0.4 else None,
+            'report-no': None,
+            'categories': ' '.join(categories),
+            'license': None,
+            'abstract': ' '.join(rng.choice(words) for _ in range(rng.randint(60, 200))),
+            'versions': versions,
+            'update_date': updated.isoformat(),
+            'authors_parsed': authors_parsed,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(scales), default='10k')
+    parser.add_argument('--records', type=int, help='Exact number of records, overrides --scale')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', required=True, help='Output .jsonl or .jsonl.gz path')
+    args = parser.parse_args()
+
+    count = args.records or scales[args.scale]
+    opener = gzip.open if args.output.endswith('.gz') else open
+    with opener(args.output, 'wt', encoding='utf-8') as output:
+        for record in generate_records(count, args.seed):
+            output.write(json.dumps(record))
+            output.write('\n')
+    print(f"Wrote {count} records to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
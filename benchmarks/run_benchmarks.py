@@ -0,0 +1,145 @@
+"""Benchmark the publication ETL stages against a local Postgres and a stub Scholar API.
+
+For every stage the runner reports wall time, records per second, database
+round-trips, HTTP calls, retries, 429 responses and the peak RSS reached so
+far. Round-trips and retries come from the metrics each task returns.
+
+    docker compose -f benchmarks/docker-compose.yml up -d
+    python benchmarks/generate_dataset.py --scale 10k --output /tmp/bench_10k.jsonl
+    python benchmarks/run_benchmarks.py --dataset /tmp/bench_10k.jsonl
+"""
+import argparse
+import importlib.util
+import json
+import os
+import resource
+import tempfile
+import time
+
+import psycopg2
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+stages = ('insert_data', 'clean_data', 'enrich_publications', 'query_and_store_citations')
+
+
+def load_dag_module(scholar_cache_path):
+    # Read by the DAG module at import time
+    os.environ['SCHOLAR_CACHE_PATH'] = scholar_cache_path
+    os.environ['FULL_REFRESH'] = '1'
+    spec = importlib.util.spec_from_file_location(
+        'process_publications_dag', os.path.join(repo_root, 'process_publications_dag.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def reset_database(db_params):
+    with psycopg2.connect(**db_params) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                TRUNCATE publications, authors, categories, authorship, publication_category,
+                         citations, citation_edges, citation_neighbourhoods, work_queue, etl_watermarks, rejected_records, log_table
+                RESTART IDENTITY CASCADE;
+            """)
+    conn.close()
+
+
+def count_rows(db_params):
+    with psycopg2.connect(**db_params) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT (SELECT COUNT(*) FROM publications), (SELECT COUNT(*) FROM citations);")
+            publications, citations = cursor.fetchone()
+    conn.close()
+    return {'publications': publications, 'citations': citations}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux; children covers the loader workers
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)
+
+
+def run_stage(dag, server, name, kwargs, db_params):
+    rows_before = count_rows(db_params)
+    http_before = server.request_count
+    throttled_before = server.throttled_count
+
+    started = time.perf_counter()
+    counters = getattr(dag, name)(**kwargs)['metrics']['counters']
+    elapsed = time.perf_counter() - started
+
+    rows_after = count_rows(db_params)
+    http_calls = server.request_count - http_before
+    if name == 'query_and_store_citations':
+        records = rows_after['citations'] - rows_before['citations']
+    elif name == 'enrich_publications':
+        records = http_calls
+    else:
+        records = abs(rows_after['publications'] - rows_before['publications'])
+
+    return {
+        'stage': name,
+        'seconds': round(elapsed, 3),
+        'records': records,
+        'records_per_sec': round(records / elapsed, 1) if elapsed else None,
+        'round_trips': counters.get('sql_statements', 0),
+        'http_calls': http_calls,
+        'http_retries': counters.get('http_retries', 0),
+        'http_429': server.throttled_count - throttled_before,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dataset', required=True, help='Dataset produced by generate_dataset.py')
+    parser.add_argument('--stages', nargs='+', choices=stages, default=list(stages))
+    parser.add_argument('--db-host', default='localhost')
+    parser.add_argument('--db-port', default='5433')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='insert_data shard workers')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--row-by-row', action='store_true', help='Disable the COPY bulk loader')
+    parser.add_argument('--cycles', type=int, default=2, help='enrich_publications cycles')
+    parser.add_argument('--latency', type=float, default=0.05, help='Stub API latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of stub responses that are 429')
+    parser.add_argument('--rate', type=float, default=50.0, help='Client token bucket rate (requests/sec)')
+    parser.add_argument('--no-reset', action='store_true', help='Keep existing rows instead of truncating')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    scholar_cache_path = os.path.join(tempfile.mkdtemp(prefix='etl_bench_'), 'scholar_cache.sqlite')
+    dag = load_dag_module(scholar_cache_path)
+    dag.dataset_path = args.dataset
+    dag.db_params.update({'host': args.db_host, 'port': args.db_port})
+    dag.serpapi_rate_limiter = dag.TokenBucket(args.rate, max(args.rate, 1))
+    server = dag.start_stub_scholar_server(latency=args.latency, error_rate=args.error_rate)
+
+    if not args.no_reset:
+        reset_database(dag.db_params)
+
+    stage_kwargs = {
+        'insert_data': {'workers': args.workers, 'batch_size': args.batch_size, 'bulk': not args.row_by_row},
+        'enrich_publications': {'cycle': args.cycles},
+    }
+    results = []
+    for name in stages:
+        if name in args.stages:
+            results.append(run_stage(dag, server, name, stage_kwargs.get(name, {}), dag.db_params))
+
+    columns = ('stage', 'seconds', 'records', 'records_per_sec', 'round_trips', 'http_calls', 'http_retries', 'http_429',
+               'peak_rss_mb')
+    print(' '.join(f"{column:>26}" if index == 0 else f"{column:>15}" for index, column in enumerate(columns)))
+    for result in results:
+        print(' '.join(f"{str(result[column]):>26}" if index == 0 else f"{str(result[column]):>15}"
+                       for index, column in enumerate(columns)))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,48 +1,184 @@
-import json
-
-# Path to the full dataset file on your local system
-full_dataset_path = r'C:\Users\Autre\Downloads\arxiv-metadata-oai-snapshot.json'  # Use a raw string
-# Path to the partial dataset file that will be created
-partial_dataset_path = 'C:\\Users\\Autre\\Desktop\\dataengineering\\dataset.json'  # Use double backslashes
-
-# The target size for the partial dataset in bytes (200 KB)
-target_size_in_bytes = 40 * 1024  # 200 KB
-
-# Initialize a counter for the number of bytes written
-bytes_written = 0
-
-# Open the full dataset file and create the partial dataset file
-with open(full_dataset_path, 'r', encoding='utf-8') as full_file, \
-     open(partial_dataset_path, 'w', encoding='utf-8') as partial_file:
-    
-    # Write the beginning of a JSON array
-    partial_file.write('[')
-    
-    # Read the first line (which should be '[' from the JSON array in the full dataset)
-    full_file.readline()
-    
-    # Iterate over each line in the full dataset file
-    for line in full_file:
-        # Check if the next line would exceed the target size
-        if bytes_written + len(line) > target_size_in_bytes:
-            # Break the loop if the target size is reached or exceeded
-            break
-        
-        # Write the line to the partial dataset file
-        partial_file.write(line)
-        
-        # Update the bytes_written counter
-        bytes_written += len(line)
-        
-        # If the line does not end with a comma, add one to separate JSON objects
-        if not line.strip().endswith(','):
-            partial_file.write(',')
-    
-    # Remove the last comma to maintain JSON format
-    partial_file.seek(partial_file.tell() - 1)
-    partial_file.truncate()
-    
-    # Write the end of the JSON array
-    partial_file.write(']')
-
-print(f'Partial dataset created at {partial_dataset_path}, size: {bytes_written} bytes')
+"""Sample records from the arXiv metadata snapshot into a smaller dataset file.
+
+The snapshot is read as one JSON record per line (JSON-lines, or a JSON array
+written one record per line). Plain files are memory-mapped and sampled with
+random seeks aligned to line boundaries, so uniform, stratified and date-range
+samples never read the whole file. Compressed inputs only support the
+streaming head and reservoir modes.
+
+    python createdataset.py arxiv-metadata-oai-snapshot.json --output dataset.json --mode head --max-bytes 40960
+    python createdataset.py arxiv-metadata-oai-snapshot.json --output sample.jsonl.gz --mode uniform --count 10000
+    python createdataset.py arxiv-metadata-oai-snapshot.json --output sample.parquet --mode stratified --count 5000 --per-category 50
+    python createdataset.py arxiv-metadata-oai-snapshot.json --output recent.jsonl --mode uniform --count 1000 --since 2023-01-01
+"""
+import argparse
+import bz2
+import gzip
+import json
+import mmap
+import random
+
+modes = ('head', 'uniform', 'reservoir', 'stratified')
+
+
+def open_binary(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def parse_line(line):
+    """Decode one record line, ignoring the brackets and commas of a JSON array."""
+    line = line.strip().lstrip(b'[,').rstrip(b'],').strip()
+    return json.loads(line) if line else None
+
+
+def line_at(data, offset):
+    """Return the (start, end) byte range of the first line starting at or after offset, wrapping at the end."""
+    start = 0 if offset == 0 else data.find(b'\n', offset - 1) + 1
+    if start >= len(data):
+        start = 0
+    end = data.find(b'\n', start)
+    return start, len(data) if end == -1 else end
+
+
+def make_filter(since, until):
+    """Accept records whose update_date lies within [since, until] (ISO dates, either bound optional)."""
+    if not since and not until:
+        return None
+
+    def accept(record):
+        updated = record.get('update_date') or ''
+        return (not since or updated >= since) and (not until or updated <= until)
+    return accept
+
+
+def sample_head(path, max_bytes, accept):
+    """Take records from the start of the file until max_bytes of input have been used."""
+    records = []
+    used = 0
+    with open_binary(path) as file:
+        for line in file:
+            if used + len(line) > max_bytes:
+                break
+            used += len(line)
+            record = parse_line(line)
+            if record is not None and (accept is None or accept(record)):
+                records.append(record)
+    return records
+
+
+def sample_reservoir(path, count, rng, accept):
+    """Uniform sample of count records in one streaming pass (works on compressed files)."""
+    reservoir = []
+    seen = 0
+    with open_binary(path) as file:
+        for line in file:
+            record = parse_line(line)
+            if record is None or (accept is not None and not accept(record)):
+                continue
+            seen += 1
+            if len(reservoir) < count:
+                reservoir.append(record)
+            else:
+                slot = rng.randrange(seen)
+                if slot < count:
+                    reservoir[slot] = record
+    return reservoir
+
+
+def sample_seek(path, count, rng, accept, per_category=None, categories=None, max_attempts=None):
+    """Sample distinct records by seeking to random offsets of the memory-mapped file.
+
+    Lines are picked in proportion to the length of the line before them,
+    which is close to uniform for the snapshot's similarly sized records.
+    With per_category, at most that many records are kept for each primary
+    category (optionally restricted to categories), giving a stratified sample.
+    """
+    if path.endswith(('.gz', '.bz2')):
+        raise SystemExit("Random seeks need an uncompressed input; use --mode head or reservoir")
+    max_attempts = max_attempts or count * 50
+    taken = {}
+    per_category_counts = {}
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for _ in range(max_attempts):
+            if len(taken) >= count:
+                break
+            if categories and all(per_category_counts.get(code, 0) >= per_category for code in categories):
+                break
+            start, end = line_at(data, rng.randrange(len(data)))
+            if start in taken:
+                continue
+            record = parse_line(data[start:end])
+            if record is None or (accept is not None and not accept(record)):
+                continue
+            if per_category:
+                primary = (record.get('categories') or '').split()[:1]
+                primary = primary[0] if primary else ''
+                if (categories and primary not in categories) or per_category_counts.get(primary, 0) >= per_category:
+                    continue
+                per_category_counts[primary] = per_category_counts.get(primary, 0) + 1
+            taken[start] = record
+    # Keep the snapshot's order in the output
+    return [taken[start] for start in sorted(taken)]
+
+
+def write_records(records, path):
+    """Write records as a JSON array (.json), JSON lines (.jsonl[.gz]) or Parquet (.parquet)."""
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow (pip install pyarrow)")
+        pq.write_table(pa.Table.from_pylist(records), path, compression='zstd')
+        return
+
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wt', encoding='utf-8') as output:
+        if path.endswith(('.json', '.json.gz')):
+            # Same layout as the snapshot: one record per line inside an array
+            output.write('[')
+            output.write('\n,'.join(json.dumps(record) for record in records))
+            output.write(']\n')
+        else:
+            for record in records:
+                output.write(json.dumps(record))
+                output.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input', help='Path to the arXiv snapshot (.json, .jsonl, optionally .gz/.bz2)')
+    parser.add_argument('--output', required=True, help='Output path: .json, .jsonl, .jsonl.gz or .parquet')
+    parser.add_argument('--mode', choices=modes, default='uniform')
+    parser.add_argument('--count', type=int, default=1000, help='Number of records to sample')
+    parser.add_argument('--max-bytes', type=int, default=40 * 1024, help='Input budget of the head mode, in bytes')
+    parser.add_argument('--per-category', type=int, help='Stratified mode: records per primary category')
+    parser.add_argument('--categories', nargs='+', help='Stratified mode: only sample these primary categories')
+    parser.add_argument('--since', help='Only keep records with update_date on or after this ISO date')
+    parser.add_argument('--until', help='Only keep records with update_date on or before this ISO date')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    accept = make_filter(args.since, args.until)
+    if args.mode == 'head':
+        records = sample_head(args.input, args.max_bytes, accept)
+    elif args.mode == 'reservoir':
+        records = sample_reservoir(args.input, args.count, rng, accept)
+    elif args.mode == 'stratified':
+        if not args.per_category:
+            parser.error('--mode stratified requires --per-category')
+        records = sample_seek(args.input, args.count, rng, accept, args.per_category, set(args.categories or ()))
+    else:
+        records = sample_seek(args.input, args.count, rng, accept)
+
+    write_records(records, args.output)
+    print(f"Sampled {len(records)} records into {args.output}")
+
+
+if __name__ == '__main__':
+    main()
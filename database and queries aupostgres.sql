@@ -1,8 +1,10 @@
 -- Creating 'publications' table with constraints
 CREATE TABLE publications (
     id SERIAL PRIMARY KEY,
+    arxiv_id VARCHAR(32) UNIQUE,
     submitter VARCHAR(255) NOT NULL,
     title TEXT NOT NULL CHECK (title <> '' AND char_length(title) > 1),
+    title_fingerprint UUID NOT NULL,
     comments TEXT,
     journal_ref VARCHAR(255),
     doi VARCHAR(255) UNIQUE,
@@ -11,21 +13,55 @@ CREATE TABLE publications (
     license VARCHAR(255),
     abstract TEXT,
     publication_type VARCHAR(255),
-    update_date DATE
+    update_date DATE,
+    latest_version VARCHAR(16)
 );
 
+-- Titles are deduplicated on a 16-byte hash of the canonicalized title
+-- (case, accents, LaTeX formatting and punctuation removed) computed by the loader
 ALTER TABLE publications
-ADD CONSTRAINT unique_title UNIQUE (title);
+ADD CONSTRAINT unique_title_fingerprint UNIQUE (title_fingerprint);
 
 CREATE TABLE citations (
     id SERIAL PRIMARY KEY,
     publication_id INT NOT NULL,
     title TEXT NOT NULL,
+    title_fingerprint UUID,
     author VARCHAR(255),
     year INT,
     FOREIGN KEY (publication_id) REFERENCES publications(id)
 );
 
+-- Resolved citation graph: publication_id cites cited_id.
+-- Built by build_citation_graph from citations whose title fingerprint matches a publication
+CREATE TABLE citation_edges (
+    publication_id INT NOT NULL,
+    cited_id INT NOT NULL,
+    PRIMARY KEY (publication_id, cited_id),
+    FOREIGN KEY (publication_id) REFERENCES publications(id),
+    FOREIGN KEY (cited_id) REFERENCES publications(id)
+);
+
+CREATE INDEX idx_citation_edges_cited_id ON citation_edges (cited_id, publication_id);
+
+-- Publications exactly hops citation links away (in either direction), rebuilt on every run
+CREATE TABLE citation_neighbourhoods (
+    publication_id INT NOT NULL,
+    hops SMALLINT NOT NULL,
+    neighbour_ids INT[] NOT NULL,
+    PRIMARY KEY (publication_id, hops),
+    FOREIGN KEY (publication_id) REFERENCES publications(id)
+);
+
+-- Matches citation titles against new publications
+CREATE INDEX idx_citations_title_fingerprint ON citations (title_fingerprint);
+
+-- Publications still waiting for resolve_publication_types
+CREATE INDEX idx_publications_untyped ON publications (id) WHERE publication_type IS NULL;
+
+-- Lets publication deletes find dependent citations without a scan
+CREATE INDEX idx_citations_publication_id ON citations (publication_id);
+
 
 
 -- Creating 'authors' table with constraints
@@ -48,6 +84,43 @@ CREATE TABLE categories (
     category_name VARCHAR(255) NOT NULL CHECK (category_name <> '')
 );
 
+-- Unique names let parallel loaders resolve author and category ids deterministically
+ALTER TABLE authors
+ADD CONSTRAINT unique_author_name UNIQUE (name);
+
+ALTER TABLE categories
+ADD CONSTRAINT unique_category_name UNIQUE (category_name);
+
+-- arXiv category hierarchy (code -> archive -> group), loaded by normalize_fields_of_study.
+-- Alias and legacy codes point at the current code through canonical_code
+CREATE TABLE category_taxonomy (
+    code VARCHAR(64) PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    archive VARCHAR(64) NOT NULL,
+    archive_name VARCHAR(255) NOT NULL,
+    group_name VARCHAR(255) NOT NULL,
+    canonical_code VARCHAR(64) NOT NULL
+);
+
+CREATE INDEX idx_category_taxonomy_group ON category_taxonomy (group_name, archive, code);
+
+-- Normalized category; category_name keeps the raw arXiv code
+ALTER TABLE categories
+ADD COLUMN taxonomy_code VARCHAR(64) REFERENCES category_taxonomy(code);
+
+CREATE INDEX idx_categories_taxonomy_code ON categories (taxonomy_code, id);
+
+-- Author resolution: name variants are blocked on surname plus first initial;
+-- merged duplicates keep their row and point at the canonical author
+ALTER TABLE authors
+ADD COLUMN normalized_name VARCHAR(255),
+ADD COLUMN blocking_key VARCHAR(255),
+ADD COLUMN canonical_id INT REFERENCES authors(id);
+
+CREATE INDEX idx_authors_blocking_key ON authors (blocking_key, id) WHERE canonical_id IS NULL;
+-- Finds the earlier duplicates of an author being merged
+CREATE INDEX idx_authors_canonical_id ON authors (canonical_id) WHERE canonical_id IS NOT NULL;
+
 -- Creating 'authorship' table with foreign key constraints
 CREATE TABLE authorship (
     publication_id INT NOT NULL,
@@ -57,6 +130,9 @@ CREATE TABLE authorship (
     FOREIGN KEY (author_id) REFERENCES authors(id)
 );
 
+-- Publications of an author: the primary key only serves lookups by publication
+CREATE INDEX idx_authorship_author_id ON authorship (author_id, publication_id);
+
 -- Creating 'publication_category' table with foreign key constraints
 CREATE TABLE publication_category (
     publication_id INT NOT NULL,
@@ -66,90 +142,272 @@ CREATE TABLE publication_category (
     FOREIGN KEY (category_id) REFERENCES categories(id)
 );
 
+-- Per-category walk in id order, used to pick papers for enrichment
+CREATE INDEX idx_publication_category_category ON publication_category (category_id, publication_id);
+
+-- Dead-letter table for input records rejected by the loader
+CREATE TABLE rejected_records (
+    id SERIAL PRIMARY KEY,
+    source_id VARCHAR(32),
+    record JSONB NOT NULL,
+    error TEXT NOT NULL,
+    rejected_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Per-publication work items of the Scholar stages (enrichment, publication_types, citations).
+-- Workers claim pending items with SELECT ... FOR UPDATE SKIP LOCKED; failed items
+-- are retried at next_retry_at with exponential backoff until they are marked failed
+CREATE TABLE work_queue (
+    publication_id INT NOT NULL,
+    stage VARCHAR(64) NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'done', 'failed')),
+    attempts INT NOT NULL DEFAULT 0,
+    next_retry_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (stage, publication_id),
+    FOREIGN KEY (publication_id) REFERENCES publications(id)
+);
+
+-- Lets claims find the ready items of a stage without scanning the finished ones
+CREATE INDEX idx_work_queue_ready ON work_queue (stage, next_retry_at, publication_id) WHERE status = 'pending';
+
+-- High-water marks of the incremental DAG tasks (JSON encoded)
+CREATE TABLE etl_watermarks (
+    task_id VARCHAR(255) PRIMARY KEY,
+    watermark TEXT NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Creating 'log_table' to store changes in the database
+-- Partitioned by month so old audit data can be dropped with DROP TABLE
 CREATE TABLE log_table (
-    log_id SERIAL PRIMARY KEY,
+    log_id BIGSERIAL,
     table_name VARCHAR(255) NOT NULL,
     operation VARCHAR(50) NOT NULL,
-    old_values TEXT,
-    new_values TEXT,
-    operation_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-);
+    row_id INT,
+    old_values JSONB,
+    new_values JSONB,
+    operation_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (log_id, operation_time)
+) PARTITION BY RANGE (operation_time);
+
+CREATE TABLE log_table_default PARTITION OF log_table DEFAULT;
+
+-- Creates the monthly partition containing the given date. Rows of that month already in
+-- the default partition (written while the partition was missing) would make the new
+-- partition overlap it, so they are moved into the table before it is attached.
+-- Returns the number of rows moved.
+DROP FUNCTION IF EXISTS create_log_table_partition(DATE);
+CREATE FUNCTION create_log_table_partition(month DATE)
+RETURNS INT AS $$
+DECLARE
+    start_date DATE := date_trunc('month', month);
+    end_date DATE := date_trunc('month', month) + INTERVAL '1 month';
+    partition_name TEXT := 'log_table_' || to_char(date_trunc('month', month), 'YYYY_MM');
+    moved INT := 0;
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN 0;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE log_table INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+    EXECUTE format('WITH moved AS (DELETE FROM log_table_default WHERE operation_time >= %L AND operation_time < %L RETURNING *) '
+                   'INSERT INTO %I SELECT * FROM moved', start_date, end_date, partition_name);
+    GET DIAGNOSTICS moved = ROW_COUNT;
+    EXECUTE format('ALTER TABLE log_table ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   partition_name, start_date, end_date);
+    RETURN moved;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drops the monthly partitions that end on or before the given date
+CREATE OR REPLACE FUNCTION drop_log_table_partitions(older_than DATE)
+RETURNS INT AS $$
+DECLARE
+    partition RECORD;
+    dropped INT := 0;
+BEGIN
+    FOR partition IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'log_table'::regclass
+          AND c.relname ~ '^log_table_\d{4}_\d{2}$'
+    LOOP
+        IF to_date(substring(partition.relname from 11), 'YYYY_MM') + INTERVAL '1 month' <= older_than THEN
+            EXECUTE format('DROP TABLE %I', partition.relname);
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_log_table_partition(CURRENT_DATE);
+SELECT create_log_table_partition((CURRENT_DATE + INTERVAL '1 month')::date);
 
 
 
 -- Trigger function for logging changes
+-- Runs once per statement over the transition tables and stores only
+-- non-null columns for inserts/deletes and only changed columns for updates
 CREATE OR REPLACE FUNCTION log_publication_changes()
 RETURNS TRIGGER AS $$
 BEGIN
-    -- Insert log record into 'log_table'
-    -- The log now includes the operation type and timestamps
-    INSERT INTO log_table (table_name, operation, old_values, new_values, operation_time)
-    VALUES ('publications', TG_OP, row_to_json(OLD), row_to_json(NEW), CURRENT_TIMESTAMP);
-
-    RETURN NEW;
+    -- Bulk jobs pause auditing with SET LOCAL etl.audit_paused = 'on'
+    IF current_setting('etl.audit_paused', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO log_table (table_name, operation, row_id, new_values)
+        SELECT 'publications', TG_OP, n.id, jsonb_strip_nulls(to_jsonb(n) - 'abstract')
+        FROM new_rows n;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO log_table (table_name, operation, row_id, old_values)
+        SELECT 'publications', TG_OP, o.id, jsonb_strip_nulls(to_jsonb(o) - 'abstract')
+        FROM old_rows o;
+    ELSE
+        INSERT INTO log_table (table_name, operation, row_id, old_values, new_values)
+        SELECT 'publications', TG_OP, diff.id, diff.old_values, diff.new_values
+        FROM (
+            SELECT n.id,
+                   (SELECT jsonb_object_agg(key, value) FROM jsonb_each(o.doc)
+                    WHERE value IS DISTINCT FROM n.doc -> key) AS old_values,
+                   (SELECT jsonb_object_agg(key, value) FROM jsonb_each(n.doc)
+                    WHERE value IS DISTINCT FROM o.doc -> key) AS new_values
+            FROM (SELECT id, to_jsonb(old_rows) - 'abstract' AS doc FROM old_rows) o
+            JOIN (SELECT id, to_jsonb(new_rows) - 'abstract' AS doc FROM new_rows) n ON n.id = o.id
+        ) diff
+        WHERE diff.new_values IS NOT NULL;
+    END IF;
+
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
-CREATE TRIGGER trg_log_publications
-AFTER INSERT OR UPDATE OR DELETE ON publications
-FOR EACH ROW
+-- Transition tables require one trigger per event
+CREATE TRIGGER trg_log_publications_insert
+AFTER INSERT ON publications
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
 EXECUTE FUNCTION log_publication_changes();
 
+CREATE TRIGGER trg_log_publications_update
+AFTER UPDATE ON publications
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION log_publication_changes();
 
+CREATE TRIGGER trg_log_publications_delete
+AFTER DELETE ON publications
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION log_publication_changes();
 
 
-SELECT a.id, a.name, COUNT(ap.publication_id) AS publication_count
+
+
+-- Reporting summaries, refreshed by the refresh_reporting_views DAG task.
+-- The unique indexes are required for REFRESH MATERIALIZED VIEW CONCURRENTLY.
+CREATE MATERIALIZED VIEW author_publication_counts AS
+SELECT a.id AS author_id, a.name, COUNT(ap.publication_id) AS publication_count
 FROM authors a
 JOIN authorship ap ON a.id = ap.author_id
-GROUP BY a.id, a.name
-ORDER BY publication_count DESC;
-
-SELECT 
-    p.id AS publication_id, 
-    p.title AS publication_title, 
-    COUNT(c.id) AS citation_count
-FROM 
-    publications p
-LEFT JOIN 
-    citations c ON p.id = c.publication_id
-GROUP BY 
-    p.id, p.title
-ORDER BY 
-    citation_count DESC, p.title;
+GROUP BY a.id, a.name;
 
+CREATE UNIQUE INDEX idx_author_publication_counts_author_id ON author_publication_counts (author_id);
+CREATE INDEX idx_author_publication_counts_count ON author_publication_counts (publication_count DESC);
 
+CREATE MATERIALIZED VIEW publication_citation_counts AS
+SELECT p.id AS publication_id, p.title AS publication_title, COUNT(c.id) AS citation_count
+FROM publications p
+LEFT JOIN citations c ON p.id = c.publication_id
+GROUP BY p.id, p.title;
 
+CREATE UNIQUE INDEX idx_publication_citation_counts_publication_id ON publication_citation_counts (publication_id);
+CREATE INDEX idx_publication_citation_counts_count ON publication_citation_counts (citation_count DESC, publication_title);
 
-SELECT cat.category_name, COUNT(p.id) AS publication_count
+CREATE MATERIALIZED VIEW category_publication_counts AS
+SELECT cat.category_name, t.group_name, t.archive, COUNT(pc.publication_id) AS publication_count
 FROM categories cat
 JOIN publication_category pc ON cat.id = pc.category_id
-JOIN publications p ON pc.publication_id = p.id
-GROUP BY cat.category_name
+LEFT JOIN category_taxonomy t ON t.code = cat.taxonomy_code
+GROUP BY cat.category_name, t.group_name, t.archive;
+
+CREATE UNIQUE INDEX idx_category_publication_counts_category_name ON category_publication_counts (category_name);
+CREATE INDEX idx_category_publication_counts_count ON category_publication_counts (publication_count DESC);
+-- Per-group and per-archive rollups read this index instead of parsing codes
+CREATE INDEX idx_category_publication_counts_group ON category_publication_counts (group_name, archive) INCLUDE (publication_count);
+
+-- Citation links between loaded publications, from the resolved citation graph
+CREATE MATERIALIZED VIEW publication_citation_degrees AS
+SELECT publication_id, SUM(in_degree)::INT AS in_degree, SUM(out_degree)::INT AS out_degree
+FROM (
+    SELECT cited_id AS publication_id, COUNT(*) AS in_degree, 0 AS out_degree
+    FROM citation_edges
+    GROUP BY cited_id
+    UNION ALL
+    SELECT publication_id, 0, COUNT(*)
+    FROM citation_edges
+    GROUP BY publication_id
+) degrees
+GROUP BY publication_id;
+
+CREATE UNIQUE INDEX idx_publication_citation_degrees_publication_id ON publication_citation_degrees (publication_id);
+CREATE INDEX idx_publication_citation_degrees_in_degree ON publication_citation_degrees (in_degree DESC);
+
+-- h-index: the largest h such that h of the author's publications have at least h citations
+CREATE MATERIALIZED VIEW author_h_index AS
+SELECT author_id,
+       COALESCE(MAX(citation_rank) FILTER (WHERE in_degree >= citation_rank), 0) AS h_index,
+       SUM(in_degree) AS citation_count
+FROM (
+    SELECT ap.author_id, d.in_degree,
+           ROW_NUMBER() OVER (PARTITION BY ap.author_id ORDER BY d.in_degree DESC) AS citation_rank
+    FROM authorship ap
+    JOIN publication_citation_degrees d ON d.publication_id = ap.publication_id
+    WHERE d.in_degree > 0
+) ranked
+GROUP BY author_id;
+
+CREATE UNIQUE INDEX idx_author_h_index_author_id ON author_h_index (author_id);
+CREATE INDEX idx_author_h_index_h_index ON author_h_index (h_index DESC);
+
+
+
+
+SELECT author_id, name, publication_count
+FROM author_publication_counts
 ORDER BY publication_count DESC;
 
+SELECT publication_id, publication_title, citation_count
+FROM publication_citation_counts
+ORDER BY citation_count DESC, publication_title;
 
-
-
-
-
-
-
-
-
-
-
-
-SELECT a.id, a.name, COUNT(ap.publication_id) AS publication_count
-FROM authors a
-JOIN authorship ap ON a.id = ap.author_id
-GROUP BY a.id, a.name
+SELECT category_name, publication_count
+FROM category_publication_counts
 ORDER BY publication_count DESC;
 
-
-SELECT p.id AS publication_id, p.title AS publication_title, COUNT(c.id) AS citation_count
-FROM publications p
-LEFT JOIN citations c ON p.id = c.publication_id
-GROUP BY p.id, p.title
-ORDER BY citation_count DESC;
-
+-- Publication-category links per group and archive (a publication counts once per category)
+SELECT group_name, archive, SUM(publication_count) AS publication_count
+FROM category_publication_counts
+GROUP BY ROLLUP (group_name, archive)
+ORDER BY group_name, archive;
+
+-- Distinct publications of one group
+SELECT COUNT(DISTINCT pc.publication_id)
+FROM category_taxonomy t
+JOIN categories c ON c.taxonomy_code = t.code
+JOIN publication_category pc ON pc.category_id = c.id
+WHERE t.group_name = 'Mathematics';
+
+SELECT a.name, h.h_index, h.citation_count
+FROM author_h_index h
+JOIN authors a ON a.id = h.author_id
+ORDER BY h.h_index DESC, h.citation_count DESC;
+
+-- Publications within two citation links of publication 1, without a recursive join
+SELECT hops, unnest(neighbour_ids) AS publication_id
+FROM citation_neighbourhoods
+WHERE publication_id = 1 AND hops <= 2;
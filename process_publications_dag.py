@@ -1,13 +1,39 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 import psycopg2
 import psycopg2.extras
+import psycopg2.extensions
+import psycopg2.pool
 import json
+import io
+import gzip
+import bz2
 import requests
+from requests.adapters import HTTPAdapter
 import logging
 import time
 import os
+import threading
+import random
+import hashlib
+import uuid
+import sqlite3
+import tempfile
+import unicodedata
+import re
+import multiprocessing
+import itertools
+import array
+import glob
+import shutil
+import bisect
+import functools
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from collections import OrderedDict
 
 # Setting up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,111 +47,1568 @@ db_params = {
     "port": "5432"
 }
 
+# Input dataset: a JSON array or JSON-lines file, optionally .gz / .bz2 compressed
+dataset_path = os.environ.get('DATASET_PATH', '/mnt/c/Users/Autre/Desktop/dataengineering/dataset.json')
+
+# Commit after this many records or this many bytes of record text, whichever comes first
+insert_batch_size = 1000
+insert_batch_bytes = 32 << 20
+
+# Load batches through COPY into staging tables instead of row-by-row INSERTs
+insert_bulk = True
+
+# Abstracts are not kept in the database; enable to store them at ingest time
+store_abstracts = False
+
+# Worker processes loading byte-range shards of the dataset in parallel
+insert_workers = os.cpu_count() or 1
+
+# Attempts at a batch that loses a deadlock or serialization conflict to another shard
+insert_batch_max_attempts = 3
+
+# Stage the dataset as partitioned Parquet (requires pyarrow) and load insert_data from it
+stage_to_parquet = os.environ.get('STAGE_TO_PARQUET') == '1'
+parquet_staging_dir = os.environ.get('PARQUET_STAGING_DIR', os.path.join(tempfile.gettempdir(), 'publication_etl_parquet'))
+
+
+### INSTRUMENTATION
+
+# Directory read by the node exporter textfile collector; unset to skip writing .prom files
+metrics_textfile_dir = os.environ.get('METRICS_TEXTFILE_DIR')
+
+# Upper bounds, in seconds, of the latency histogram buckets
+latency_buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def new_histogram():
+    return {'buckets': [0] * (len(latency_buckets) + 1), 'count': 0, 'sum': 0.0, 'max': 0.0}
+
+def histogram_quantile(histogram, quantile):
+    """Upper bound of the bucket holding the given quantile (the maximum for the overflow bucket)."""
+    rank = quantile * histogram['count']
+    cumulative = 0
+    for bound, count in zip(latency_buckets, histogram['buckets']):
+        cumulative += count
+        if cumulative >= rank:
+            return min(bound, histogram['max'])
+    return histogram['max']
+
+
+class Metrics:
+    """Thread-safe counters and latency histograms for the task running in this process.
+
+    Counters measure work done (rows read and written, SQL statements, cache
+    hits, HTTP calls, retries, 429s); histograms bucket durations in seconds.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def incr(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = new_histogram()
+            histogram['buckets'][bisect.bisect_left(latency_buckets, seconds)] += 1
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            histogram['max'] = max(histogram['max'], seconds)
+
+    @contextmanager
+    def timer(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def snapshot(self):
+        """Return a picklable copy of the counters and histograms."""
+        with self.lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': {name: dict(histogram, buckets=list(histogram['buckets']))
+                               for name, histogram in self.histograms.items()},
+            }
+
+    def merge(self, snapshot):
+        """Add a snapshot taken in another process, such as a shard worker."""
+        with self.lock:
+            for name, value in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, other in snapshot['histograms'].items():
+                histogram = self.histograms.setdefault(name, new_histogram())
+                histogram['buckets'] = [a + b for a, b in zip(histogram['buckets'], other['buckets'])]
+                histogram['count'] += other['count']
+                histogram['sum'] += other['sum']
+                histogram['max'] = max(histogram['max'], other['max'])
+
+    def summary(self):
+        """Counters plus count, total, mean, p95 and max of each histogram; small enough for XCom."""
+        snapshot = self.snapshot()
+        timings = {}
+        for name, histogram in snapshot['histograms'].items():
+            timings[name] = {
+                'count': histogram['count'],
+                'total_seconds': round(histogram['sum'], 3),
+                'mean_seconds': round(histogram['sum'] / histogram['count'], 4) if histogram['count'] else 0.0,
+                'p95_seconds': round(histogram_quantile(histogram, 0.95), 4),
+                'max_seconds': round(histogram['max'], 4),
+            }
+        return {'counters': snapshot['counters'], 'timings': timings}
+
+    def write_textfile(self, task_id, directory, success):
+        """Write the metrics in Prometheus text format, replacing the task's previous file atomically."""
+        snapshot = self.snapshot()
+        label = f'task="{task_id}"'
+        lines = [
+            "# TYPE publication_etl_task_success gauge",
+            f"publication_etl_task_success{{{label}}} {int(success)}",
+            "# TYPE publication_etl_task_last_run_timestamp_seconds gauge",
+            f"publication_etl_task_last_run_timestamp_seconds{{{label}}} {time.time():.0f}",
+        ]
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f"# TYPE publication_etl_{name}_total counter")
+            lines.append(f"publication_etl_{name}_total{{{label}}} {value}")
+        for name, histogram in sorted(snapshot['histograms'].items()):
+            lines.append(f"# TYPE publication_etl_{name} histogram")
+            cumulative = 0
+            for bound, count in zip(latency_buckets + (None,), histogram['buckets']):
+                cumulative += count
+                le = '+Inf' if bound is None else bound
+                lines.append(f'publication_etl_{name}_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f"publication_etl_{name}_sum{{{label}}} {histogram['sum']:.6f}")
+            lines.append(f"publication_etl_{name}_count{{{label}}} {histogram['count']}")
+
+        path = os.path.join(directory, f"publication_etl_{task_id}.prom")
+        with open(path + '.tmp', 'w', encoding='utf-8') as output:
+            output.write('\n'.join(lines) + '\n')
+        os.replace(path + '.tmp', path)
+
+
+# Metrics of the task running in this process, reset at the start of every task
+metrics = Metrics()
+
+
+class MetricsLogHandler(logging.Handler):
+    """Counts the warnings and errors logged while a task runs."""
+
+    def emit(self, record):
+        metrics.incr('log_errors' if record.levelno >= logging.ERROR else 'log_warnings')
+
+
+logging.getLogger().addHandler(MetricsLogHandler(logging.WARNING))
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """Cursor that counts and times every statement it sends to the server."""
+
+    def execute(self, query, vars=None):
+        metrics.incr('sql_statements')
+        with metrics.timer('sql_seconds'):
+            return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        metrics.incr('sql_statements', len(vars_list))
+        with metrics.timer('sql_seconds'):
+            return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        metrics.incr('sql_statements')
+        with metrics.timer('sql_seconds'):
+            return super().copy_expert(sql, file, size)
+
+
+# Every connection opened with db_params counts and times its statements
+db_params['cursor_factory'] = InstrumentedCursor
+
+def instrumented_task(func):
+    """Report a task's metrics when it finishes.
+
+    The metrics are logged as one JSON line, written to metrics_textfile_dir
+    and returned with the task's result, so PythonOperator pushes them to XCom.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics.reset()
+        success = False
+        try:
+            with metrics.timer('task_seconds'):
+                result = func(*args, **kwargs)
+            success = True
+        finally:
+            summary = metrics.summary()
+            logging.info(f"Task metrics: {json.dumps(dict(summary, task=func.__name__, success=success), sort_keys=True)}")
+            if metrics_textfile_dir:
+                try:
+                    metrics.write_textfile(func.__name__, metrics_textfile_dir, success)
+                except OSError as e:
+                    logging.warning(f"Could not write metrics textfile: {e}")
+        if isinstance(result, dict):
+            return dict(result, metrics=summary)
+        return {'result': result, 'metrics': summary}
+    return wrapper
+
+
+### DATABASE CONNECTIONS
+
+# Connections kept by each worker process's pool
+db_pool_min_connections = 1
+db_pool_max_connections = 8
+
+# Rows fetched per round trip by the server-side cursors of stream_rows
+read_itersize = 10000
+
+_db_pool = None
+_db_pool_pid = None
+_db_pool_lock = threading.Lock()
+_stream_names = itertools.count()
+
+def get_db_pool():
+    """Return this process's connection pool, opening it on first use."""
+    global _db_pool, _db_pool_pid
+    with _db_pool_lock:
+        # A forked worker must not use its parent's sockets: it gets its own pool
+        if _db_pool is None or _db_pool_pid != os.getpid():
+            _db_pool = psycopg2.pool.ThreadedConnectionPool(db_pool_min_connections, db_pool_max_connections, **db_params)
+            _db_pool_pid = os.getpid()
+        return _db_pool
+
+def close_db_pool():
+    """Close the pooled connections, e.g. before forking workers that would inherit them."""
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is not None and _db_pool_pid == os.getpid():
+            _db_pool.closeall()
+        _db_pool = None
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled connection for one unit of work.
+
+    Commits when the block succeeds and rolls back when it raises, like
+    `with psycopg2.connect(...)`, then hands the connection back to the pool.
+    """
+    pool = get_db_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            pass  # Broken connection, discarded below
+        raise
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+@contextmanager
+def stream_rows(query, params=None, itersize=read_itersize):
+    """Run a query on a named server-side cursor of its own pooled connection.
+
+    Iterating the cursor fetches itersize rows per round trip, so memory stays
+    flat whatever the table size. Writes made while iterating go through a
+    separate db_connection().
+    """
+    with db_connection() as conn:
+        with conn.cursor(name=f"stream_{next(_stream_names)}") as cursor:
+            cursor.itersize = itersize
+            cursor.execute(query, params)
+            yield cursor
+
+
+### INCREMENTAL RUNS
+
+def is_full_refresh(context):
+    """A full refresh is requested with {"full_refresh": true} in the DAG run conf or FULL_REFRESH=1."""
+    dag_run = context.get('dag_run')
+    conf = (dag_run.conf or {}) if dag_run is not None else {}
+    return bool(conf.get('full_refresh')) or os.environ.get('FULL_REFRESH') == '1'
+
+def get_watermark(cursor, task_id, full_refresh=False):
+    """Return the stored high-water mark for a task, or None on a full refresh or first run."""
+    if full_refresh:
+        return None
+    cursor.execute("SELECT watermark FROM etl_watermarks WHERE task_id = %s;", (task_id,))
+    result = cursor.fetchone()
+    return json.loads(result[0]) if result else None
+
+def set_watermark(cursor, task_id, watermark):
+    """Persist a task's high-water mark; commit it together with the work it covers."""
+    cursor.execute("""
+        INSERT INTO etl_watermarks (task_id, watermark, updated_at)
+        VALUES (%s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (task_id) DO UPDATE
+        SET watermark = EXCLUDED.watermark,
+            updated_at = EXCLUDED.updated_at;
+    """, (task_id, json.dumps(watermark)))
+
+
+### AUDIT LOGGING
+
+# Bulk loads skip the per-row audit trail and write one summary entry per shard
+audit_bulk_loads = False
+
+# Monthly log_table partitions older than this are dropped
+audit_retention_months = 6
+
+def pause_audit(cursor):
+    """Skip publication audit logging for the rest of the current transaction."""
+    cursor.execute("SELECT set_config('etl.audit_paused', 'on', true);")
+
+def log_bulk_operation(cursor, operation, details):
+    """Record one summary audit entry for a bulk step run with auditing paused."""
+    cursor.execute("""
+        INSERT INTO log_table (table_name, operation, new_values)
+        VALUES ('publications', %s, %s);
+    """, (operation, json.dumps(details)))
+
+def maintain_audit_log(cursor):
+    """Create the log_table partitions this run needs and drop those past the retention period.
+
+    Besides this month and the next, partitions are created for the months
+    found in the default partition (rows written while the DAG was paused),
+    which moves those rows out of it so they are dropped with their month.
+    """
+    today = datetime.now().date()
+    this_month = today.replace(day=1)
+    next_month = (this_month + timedelta(days=32)).replace(day=1)
+    cursor.execute("SELECT DISTINCT date_trunc('month', operation_time)::date FROM log_table_default;")
+    months = sorted({month for month, in cursor.fetchall()} | {this_month, next_month})
+    rows_moved = 0
+    for month in months:
+        cursor.execute("SELECT create_log_table_partition(%s);", (month,))
+        rows_moved += cursor.fetchone()[0]
+    if rows_moved:
+        logging.warning(f"Moved {rows_moved} audit rows out of log_table_default into their monthly partitions")
+
+    month_index = today.year * 12 + today.month - 1 - audit_retention_months
+    cutoff = today.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+    cursor.execute("SELECT drop_log_table_partitions(%s);", (cutoff,))
+    return {'audit_partitions_dropped': cursor.fetchone()[0], 'audit_rows_moved': rows_moved}
+
 
 ### DATA INSERTION TASK
 
+class IdCache:
+    """Bounded LRU cache of name -> id lookups with hit/miss counters.
+
+    Ids inserted by the current transaction are tracked as pending, so they can
+    be dropped again if the transaction or a savepoint is rolled back.
+    """
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.pending = []
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                metrics.incr(f"{self.name}_id_cache_misses")
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        metrics.incr(f"{self.name}_id_cache_hits")
+        return value
+
+    def put(self, key, value, pending=False):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if pending:
+                self.pending.append(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def mark(self):
+        """Return a marker for the current set of pending ids, to pass to rollback()."""
+        with self.lock:
+            return len(self.pending)
+
+    def commit(self):
+        with self.lock:
+            self.pending.clear()
+
+    def rollback(self, mark=0):
+        with self.lock:
+            for key in self.pending[mark:]:
+                self.entries.pop(key, None)
+            del self.pending[mark:]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.pending.clear()
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def log_stats(self):
+        logging.info(f"{self.name} id cache: {len(self.entries)} entries, {self.hits} hits, "
+                     f"{self.misses} misses, hit rate {self.hit_rate():.1%}")
+
+
+# Shared name -> id caches for the get_or_insert_* helpers
+author_id_cache = IdCache('authors', maxsize=200000)
+category_id_cache = IdCache('categories', maxsize=20000)
+id_caches = (author_id_cache, category_id_cache)
+
+def commit_id_caches():
+    for cache in id_caches:
+        cache.commit()
+
+def mark_id_caches():
+    return [cache.mark() for cache in id_caches]
+
+def rollback_id_caches(marks=None):
+    for cache, mark in zip(id_caches, marks or [0] * len(id_caches)):
+        cache.rollback(mark)
+
+def log_id_cache_stats():
+    for cache in id_caches:
+        cache.log_stats()
+
+def warm_id_caches(cursor):
+    """Preload the caches with the most frequently used authors and categories."""
+    cursor.execute("""
+        SELECT a.name, MIN(a.id)
+        FROM authors a
+        JOIN authorship ap ON ap.author_id = a.id
+        GROUP BY a.name
+        ORDER BY COUNT(*) DESC
+        LIMIT %s;
+    """, (author_id_cache.maxsize,))
+    # Insert the most used names last so they are the last to be evicted
+    for name, author_id in reversed(cursor.fetchall()):
+        author_id_cache.put(name, author_id)
+
+    cursor.execute("""
+        SELECT category_name, MIN(id)
+        FROM categories
+        GROUP BY category_name
+        LIMIT %s;
+    """, (category_id_cache.maxsize,))
+    for category_name, category_id in cursor.fetchall():
+        category_id_cache.put(category_name, category_id)
+
 def get_or_insert_author_id(cursor, author_name):
-    cursor.execute("SELECT id FROM authors WHERE name = %s;", (author_name,))
+    author_id = author_id_cache.get(author_name)
+    if author_id is not None:
+        return author_id
+
+    cursor.execute("SELECT COALESCE(canonical_id, id) FROM authors WHERE name = %s;", (author_name,))
     result = cursor.fetchone()
     if result:
+        author_id_cache.put(author_name, result[0])
         return result[0]
     else:
-        cursor.execute("INSERT INTO authors (name, affiliation) VALUES (%s, 'Unknown') RETURNING id;", (author_name,))
+        # Another loader may insert the same name concurrently; the unique constraint arbitrates
+        cursor.execute("""
+            INSERT INTO authors (name, affiliation) VALUES (%s, 'Unknown')
+            ON CONFLICT (name) DO NOTHING
+            RETURNING id;
+        """, (author_name,))
+        result = cursor.fetchone()
+        if result:
+            author_id_cache.put(author_name, result[0], pending=True)
+            return result[0]
+        cursor.execute("SELECT COALESCE(canonical_id, id) FROM authors WHERE name = %s;", (author_name,))
         return cursor.fetchone()[0]
 
 def get_or_insert_category_id(cursor, category_name):
+    category_id = category_id_cache.get(category_name)
+    if category_id is not None:
+        return category_id
+
     cursor.execute("SELECT id FROM categories WHERE category_name = %s;", (category_name,))
     result = cursor.fetchone()
     if result:
+        category_id_cache.put(category_name, result[0])
         return result[0]
     else:
-        cursor.execute("INSERT INTO categories (category_name) VALUES (%s) RETURNING id;", (category_name,))
+        cursor.execute("""
+            INSERT INTO categories (category_name) VALUES (%s)
+            ON CONFLICT (category_name) DO NOTHING
+            RETURNING id;
+        """, (category_name,))
+        result = cursor.fetchone()
+        if result:
+            category_id_cache.put(category_name, result[0], pending=True)
+            return result[0]
+        cursor.execute("SELECT id FROM categories WHERE category_name = %s;", (category_name,))
         return cursor.fetchone()[0]
 
-def insert_data():
+def resolve_name_ids(cursor, cache, names, insert_query, select_query):
+    """Map names to ids through the cache, inserting all missing names in one statement."""
+    ids = {}
+    missing = []
+    for name in set(names):
+        cached = cache.get(name)
+        if cached is None:
+            missing.append(name)
+        else:
+            ids[name] = cached
+    if not missing:
+        return ids
+
+    # Sorted so that concurrent writers lock new keys in the same order
+    missing.sort()
+    cursor.execute(insert_query, (missing,))
+    for name, name_id in cursor.fetchall():
+        ids[name] = name_id
+        cache.put(name, name_id, pending=True)
+
+    existing = [name for name in missing if name not in ids]
+    if existing:
+        cursor.execute(select_query, (existing,))
+        for name, name_id in cursor.fetchall():
+            ids[name] = name_id
+            cache.put(name, name_id)
+    return ids
+
+def resolve_author_ids(cursor, names):
+    return resolve_name_ids(cursor, author_id_cache, names, """
+        INSERT INTO authors (name, affiliation)
+        SELECT name, 'Unknown' FROM unnest(%s::text[]) AS name ORDER BY name
+        ON CONFLICT (name) DO NOTHING
+        RETURNING name, id;
+    """, "SELECT name, COALESCE(canonical_id, id) FROM authors WHERE name = ANY(%s);")
+
+def resolve_category_ids(cursor, names):
+    return resolve_name_ids(cursor, category_id_cache, names, """
+        INSERT INTO categories (category_name)
+        SELECT name FROM unnest(%s::text[]) AS name ORDER BY name
+        ON CONFLICT (category_name) DO NOTHING
+        RETURNING category_name, id;
+    """, "SELECT category_name, id FROM categories WHERE category_name = ANY(%s);")
+
+def open_dataset(path):
+    """Open a plain, gzip or bz2 compressed dataset file for text reading."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+def iter_records(path, chunk_size=1 << 20, max_record_size=64 << 20):
+    """Yield records one at a time from a JSON array or a JSON-lines file.
+
+    Only the current chunk and the record being decoded are kept in memory,
+    so the footprint stays bounded whatever the size of the input.
+    """
+    decoder = json.JSONDecoder()
+    separators = ' \t\r\n[],'
+    with open_dataset(path) as file:
+        buffer = ''
+        pos = 0
+        eof = False
+        while True:
+            # Skip whitespace, array brackets and commas between records
+            while pos < len(buffer) and buffer[pos] in separators:
+                pos += 1
+            if pos == len(buffer):
+                if eof:
+                    return
+                buffer = file.read(chunk_size)
+                pos = 0
+                eof = not buffer
+                continue
+
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Most likely a record cut at the chunk boundary: read more and retry
+                if eof:
+                    raise
+                if len(buffer) - pos > max_record_size:
+                    raise ValueError(f"Record at offset {pos} exceeds {max_record_size} bytes")
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+
+            yield record
+
+def estimate_record_size(record):
+    """Cheap estimate of a record's size from its top-level string fields."""
+    return sum(len(value) for value in record.values() if isinstance(value, str))
+
+def iter_batches(records, batch_size, max_bytes=None):
+    """Group records into lists of at most batch_size items and roughly max_bytes of text."""
+    batch = []
+    batch_bytes = 0
+    for record in records:
+        batch.append(record)
+        if max_bytes:
+            batch_bytes += estimate_record_size(record)
+        if len(batch) >= batch_size or (max_bytes and batch_bytes >= max_bytes):
+            yield batch
+            batch = []
+            batch_bytes = 0
+    if batch:
+        yield batch
+
+# arXiv author strings separate names with commas and a final " and "
+author_separator = re.compile(r',\s*|\s+and\s+')
+
+def parse_authors(item):
+    """Return the author names of a record, preferring the pre-split authors_parsed field."""
+    authors = item.get("authors")
+    if isinstance(authors, list):
+        # Already split, as in records read back from the Parquet staging copy
+        return authors
+    parsed = item.get("authors_parsed")
+    if parsed:
+        names = []
+        for parts in parsed:
+            last, first, suffix = (list(parts) + ['', '', ''])[:3]
+            name = ' '.join(part.strip() for part in (first, last, suffix) if part and part.strip())
+            if name:
+                names.append(name)
+        return names
+    return [name.strip() for name in author_separator.split(item.get("authors") or '') if name.strip()]
+
+def parse_update_date(value, default):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return default
+
+def latest_version(versions):
+    """Return the newest version label ('v3') from an arXiv versions list."""
+    newest = None
+    newest_number = -1
+    for version in versions or ():
+        label = version.get("version", '')
+        number = int(label[1:]) if label[1:].isdigit() else 0
+        if number > newest_number:
+            newest, newest_number = label, number
+    return newest
+
+# LaTeX formatting commands whose argument is kept as plain title text
+latex_formatting = re.compile(r'\\(?:emph|text(?:it|bf|rm|sc|tt)?|math(?:rm|bf|cal|it|bb|sf)|it|bf|rm)\b')
+# Accent commands such as \" or \' (the accented letter follows)
+latex_accent = re.compile(r'\\[^a-zA-Z]')
+
+def title_fingerprint(title):
+    """Fixed-width dedup key of a title, as a UUID string.
+
+    The title is canonicalized before hashing so that case, accents, LaTeX
+    formatting, whitespace and punctuation do not make two spellings of the
+    same title distinct. Other LaTeX commands keep their name (\\alpha becomes
+    alpha) so titles that differ only in a symbol stay apart.
+    """
+    title = latex_accent.sub('', latex_formatting.sub(' ', title))
+    title = unicodedata.normalize('NFKD', title)
+    title = ''.join(char for char in title if not unicodedata.combining(char)).casefold()
+    canonical = ' '.join(re.findall(r'\w+', title))
+    return str(uuid.UUID(bytes=hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).digest()))
+
+# Publication columns produced by transform_batch, in staging table order
+publication_columns = ('arxiv_id', 'submitter', 'title', 'title_fingerprint', 'comments', 'journal_ref', 'doi',
+                       'report_no', 'categories', 'license', 'abstract', 'update_date', 'latest_version')
+
+def transform_batch(batch):
+    """Turn a batch of raw records into typed column arrays in a single pass.
+
+    Returns (publications, authorship, categories). publications maps 'seq'
+    and each name in publication_columns to a list with one entry per record;
+    authorship and categories are the exploded (seq, name) columns, seq being
+    the record's position in the batch.
+    """
+    today = datetime.now().date()
+    publications = {column: [] for column in ('seq',) + publication_columns}
+    authorship = {'seq': [], 'author_name': []}
+    categories = {'seq': [], 'category_name': []}
+
+    for seq, item in enumerate(batch):
+        publications['seq'].append(seq)
+        publications['arxiv_id'].append(item.get("id"))
+        publications['submitter'].append(item["submitter"])
+        publications['title'].append(item["title"])
+        publications['title_fingerprint'].append(title_fingerprint(item["title"]))
+        publications['comments'].append(item.get("comments"))
+        publications['journal_ref'].append(item.get("journal-ref"))
+        publications['doi'].append(item.get("doi"))
+        publications['report_no'].append(item.get("report-no"))
+        publications['categories'].append(item.get("categories"))
+        publications['license'].append(item.get("license"))
+        publications['abstract'].append(item.get("abstract") if store_abstracts else None)
+        publications['update_date'].append(parse_update_date(item.get("update_date"), today))
+        publications['latest_version'].append(latest_version(item.get("versions")))
+
+        names = parse_authors(item)
+        authorship['seq'].extend([seq] * len(names))
+        authorship['author_name'].extend(names)
+
+        codes = (item.get("categories") or '').split()
+        categories['seq'].extend([seq] * len(codes))
+        categories['category_name'].extend(codes)
+
+    return publications, authorship, categories
+
+def collision_error(fingerprint_owner, doi_owner):
+    """Dead-letter message of a record whose title fingerprint or DOI belongs to another publication."""
+    if fingerprint_owner:
+        return f"Title fingerprint already used by publication {fingerprint_owner}"
+    if doi_owner:
+        return f"DOI already used by publication {doi_owner}"
+    return "Conflicts with an existing publication"
+
+def insert_publication(cursor, item, full_refresh=False):
+    """Insert a record, or update its publication when the record is newer (always on a full refresh).
+
+    A record whose title fingerprint matches a row added by enrichment
+    (without an arxiv_id) takes that row over. Authors and categories of an
+    updated publication are replaced, and a record colliding with another
+    publication's fingerprint or DOI is dead-lettered. Returns the id of a
+    newly inserted publication, None otherwise.
+    """
+    row = {
+        'arxiv_id': item.get("id"),
+        'submitter': item["submitter"],
+        'title': item["title"],
+        'title_fingerprint': title_fingerprint(item["title"]),
+        'comments': item.get("comments"),
+        'journal_ref': item.get("journal-ref"),
+        'doi': item.get("doi"),
+        'report_no': item.get("report-no"),
+        'categories': item.get("categories"),
+        'license': item.get("license"),
+        'abstract': item.get("abstract") if store_abstracts else None,
+        'update_date': parse_update_date(item.get("update_date"), datetime.now().date()),
+        'latest_version': latest_version(item.get("versions")),
+        'full_refresh': full_refresh,
+    }
+    cursor.execute("""
+        UPDATE publications
+        SET submitter = %(submitter)s, title = %(title)s, title_fingerprint = %(title_fingerprint)s::uuid,
+            comments = %(comments)s, journal_ref = %(journal_ref)s, doi = %(doi)s, report_no = %(report_no)s,
+            categories = %(categories)s, license = %(license)s, abstract = %(abstract)s,
+            update_date = %(update_date)s, latest_version = %(latest_version)s
+        WHERE arxiv_id = %(arxiv_id)s
+          AND (%(full_refresh)s OR update_date < %(update_date)s OR latest_version IS DISTINCT FROM %(latest_version)s)
+        RETURNING id;
+    """, row)
+    if cursor.rowcount:
+        publication_id = cursor.fetchone()[0]
+        cursor.execute("""
+            DELETE FROM authorship WHERE publication_id = %(id)s;
+            DELETE FROM publication_category WHERE publication_id = %(id)s;
+        """, {'id': publication_id})
+        metrics.incr('publications_updated')
+        inserted = False
+    else:
+        cursor.execute("""
+            UPDATE publications
+            SET arxiv_id = %(arxiv_id)s, submitter = %(submitter)s, title = %(title)s, comments = %(comments)s,
+                journal_ref = %(journal_ref)s, doi = %(doi)s, report_no = %(report_no)s, categories = %(categories)s,
+                license = %(license)s, abstract = %(abstract)s, update_date = %(update_date)s,
+                latest_version = %(latest_version)s
+            WHERE title_fingerprint = %(title_fingerprint)s::uuid AND arxiv_id IS NULL AND %(arxiv_id)s IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM publications e WHERE e.arxiv_id = %(arxiv_id)s)
+              AND NOT EXISTS (SELECT 1 FROM publications d WHERE d.doi = %(doi)s AND d.title_fingerprint <> %(title_fingerprint)s::uuid)
+            RETURNING id;
+        """, row)
+        if cursor.rowcount:
+            publication_id = cursor.fetchone()[0]
+            cursor.execute("""
+                DELETE FROM authorship WHERE publication_id = %(id)s;
+                DELETE FROM publication_category WHERE publication_id = %(id)s;
+            """, {'id': publication_id})
+            metrics.incr('publications_claimed')
+            inserted = False
+        else:
+            cursor.execute("""
+                INSERT INTO publications (arxiv_id, submitter, title, title_fingerprint, comments, journal_ref, doi, report_no, categories, license, abstract, update_date, latest_version)
+                SELECT %(arxiv_id)s, %(submitter)s, %(title)s, %(title_fingerprint)s::uuid, %(comments)s, %(journal_ref)s, %(doi)s,
+                       %(report_no)s, %(categories)s, %(license)s, %(abstract)s, %(update_date)s, %(latest_version)s
+                WHERE NOT EXISTS (SELECT 1 FROM publications WHERE arxiv_id = %(arxiv_id)s)
+                ON CONFLICT DO NOTHING
+                RETURNING id;
+            """, row)
+            publication_id = cursor.fetchone()[0] if cursor.rowcount else None
+            inserted = True
+            if publication_id is None:
+                cursor.execute("""
+                    SELECT EXISTS (SELECT 1 FROM publications WHERE arxiv_id = %(arxiv_id)s),
+                           (SELECT id FROM publications WHERE title_fingerprint = %(title_fingerprint)s::uuid),
+                           (SELECT id FROM publications WHERE doi = %(doi)s);
+                """, row)
+                known, fingerprint_owner, doi_owner = cursor.fetchone()
+                if not known:
+                    metrics.incr('records_duplicate')
+                    reject_record(cursor, item, collision_error(fingerprint_owner, doi_owner))
+
+    if publication_id:
+        # Sorted like the bulk path, so concurrent loaders take the name locks in the same order
+        authors_data = [(get_or_insert_author_id(cursor, name), publication_id) for name in sorted(set(parse_authors(item)))]
+        psycopg2.extras.execute_values(cursor, "INSERT INTO authorship (author_id, publication_id) VALUES %s ON CONFLICT DO NOTHING;", authors_data)
+
+        categories_data = [(publication_id, get_or_insert_category_id(cursor, category)) for category in sorted(set((item.get("categories") or '').split()))]
+        psycopg2.extras.execute_values(cursor, "INSERT INTO publication_category (publication_id, category_id) VALUES %s ON CONFLICT DO NOTHING;", categories_data)
+    return publication_id if inserted else None
+
+def copy_value(value):
+    """Render a value for COPY ... FROM STDIN in PostgreSQL text format."""
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+def copy_rows(cursor, table, columns, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN;", buffer)
+
+def copy_columns(cursor, table, columns):
+    """COPY a mapping of column name -> equally long list of values into table."""
+    copy_rows(cursor, table, list(columns), zip(*columns.values()))
+
+def create_staging_tables(cursor):
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS staging_publications (
+            seq INT PRIMARY KEY,
+            id INT,
+            arxiv_id TEXT,
+            submitter TEXT,
+            title TEXT,
+            title_fingerprint UUID,
+            comments TEXT,
+            journal_ref TEXT,
+            doi TEXT,
+            report_no TEXT,
+            categories TEXT,
+            license TEXT,
+            abstract TEXT,
+            update_date DATE,
+            latest_version TEXT
+        );
+        CREATE TEMP TABLE IF NOT EXISTS staging_authorship (seq INT NOT NULL, author_name TEXT NOT NULL);
+        CREATE TEMP TABLE IF NOT EXISTS staging_publication_category (seq INT NOT NULL, category_name TEXT NOT NULL);
+        CREATE TEMP TABLE IF NOT EXISTS staging_inserted (id INT PRIMARY KEY);
+    """)
+
+def bulk_insert_publications(cursor, batch, full_refresh=False):
+    """Load a batch of records with COPY and set-based SQL.
+
+    The batch is staged in temp tables. Records of known publications update
+    them when they are newer (always on a full refresh) and have their
+    authors and categories replaced, as do records taking over a row added by
+    enrichment with the same title fingerprint; records colliding with another
+    publication's fingerprint or DOI are dead-lettered. Publication ids of the new ones are
+    drawn from the sequence up front so staged authors and categories can be
+    joined back to them, and the real tables are filled with one statement
+    each. New keys are inserted in sorted order so concurrent loaders lock
+    them in the same order and cannot deadlock. Returns the number of
+    publications inserted.
+    """
+    publications, authorship, categories = transform_batch(batch)
+
+    cursor.execute("TRUNCATE staging_publications, staging_authorship, staging_publication_category, staging_inserted;")
+    copy_columns(cursor, 'staging_publications', publications)
+    copy_columns(cursor, 'staging_authorship', authorship)
+    copy_columns(cursor, 'staging_publication_category', categories)
+
+    cursor.execute("""
+        WITH updated AS (
+            UPDATE publications p
+            SET submitter = sp.submitter, title = sp.title, title_fingerprint = sp.title_fingerprint,
+                comments = sp.comments, journal_ref = sp.journal_ref, doi = sp.doi, report_no = sp.report_no,
+                categories = sp.categories, license = sp.license, abstract = sp.abstract,
+                update_date = sp.update_date, latest_version = sp.latest_version
+            FROM staging_publications sp
+            WHERE p.arxiv_id = sp.arxiv_id
+              AND (%s OR p.update_date < sp.update_date OR p.latest_version IS DISTINCT FROM sp.latest_version)
+            RETURNING p.id, sp.seq
+        )
+        UPDATE staging_publications sp SET id = u.id FROM updated u WHERE sp.seq = u.seq;
+    """, (full_refresh,))
+    metrics.incr('publications_updated', cursor.rowcount)
+
+    # Records matching a row added by enrichment (no arxiv_id) by title fingerprint take it over
+    cursor.execute("""
+        WITH claimed AS (
+            UPDATE publications p
+            SET arxiv_id = sp.arxiv_id, submitter = sp.submitter, title = sp.title, comments = sp.comments,
+                journal_ref = sp.journal_ref, doi = sp.doi, report_no = sp.report_no, categories = sp.categories,
+                license = sp.license, abstract = sp.abstract, update_date = sp.update_date,
+                latest_version = sp.latest_version
+            FROM staging_publications sp
+            WHERE p.title_fingerprint = sp.title_fingerprint AND p.arxiv_id IS NULL
+              AND sp.id IS NULL AND sp.arxiv_id IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM publications e WHERE e.arxiv_id = sp.arxiv_id)
+              AND NOT EXISTS (SELECT 1 FROM publications d WHERE d.doi = sp.doi AND d.id <> p.id)
+            RETURNING p.id, sp.seq
+        )
+        UPDATE staging_publications sp SET id = c.id FROM claimed c WHERE sp.seq = c.seq;
+    """)
+    metrics.incr('publications_claimed', cursor.rowcount)
+
+    cursor.execute("""
+        INSERT INTO staging_inserted (id) SELECT id FROM staging_publications WHERE id IS NOT NULL;
+        DELETE FROM authorship ap USING staging_inserted si WHERE ap.publication_id = si.id;
+        DELETE FROM publication_category pc USING staging_inserted si WHERE pc.publication_id = si.id;
+    """)
+
+    cursor.execute("""
+        UPDATE staging_publications SET id = nextval(pg_get_serial_sequence('publications', 'id')) WHERE id IS NULL;
+
+        WITH inserted AS (
+            INSERT INTO publications (id, arxiv_id, submitter, title, title_fingerprint, comments, journal_ref, doi, report_no, categories, license, abstract, update_date, latest_version)
+            SELECT id, arxiv_id, submitter, title, title_fingerprint, comments, journal_ref, doi, report_no, categories, license, abstract, update_date, latest_version
+            FROM staging_publications sp
+            WHERE NOT EXISTS (SELECT 1 FROM publications p WHERE p.arxiv_id = sp.arxiv_id)
+            ORDER BY doi
+            -- Every unique key is an arbiter: a repeated DOI or title fingerprint skips the record
+            ON CONFLICT DO NOTHING
+            RETURNING id
+        )
+        INSERT INTO staging_inserted (id) SELECT id FROM inserted;
+    """)
+    inserted_count = cursor.rowcount
+
+    # Records skipped for another publication's fingerprint or DOI go to the dead-letter table
+    cursor.execute("""
+        SELECT sp.seq,
+               (SELECT p.id FROM publications p WHERE p.title_fingerprint = sp.title_fingerprint),
+               (SELECT p.id FROM publications p WHERE p.doi = sp.doi)
+        FROM staging_publications sp
+        WHERE NOT EXISTS (SELECT 1 FROM staging_inserted si WHERE si.id = sp.id)
+          AND NOT EXISTS (SELECT 1 FROM publications p WHERE p.arxiv_id = sp.arxiv_id)
+        ORDER BY sp.seq;
+    """)
+    for seq, fingerprint_owner, doi_owner in cursor.fetchall():
+        metrics.incr('records_duplicate')
+        reject_record(cursor, batch[seq], collision_error(fingerprint_owner, doi_owner))
+
+    cursor.execute("""
+        INSERT INTO authors (name, affiliation)
+        SELECT DISTINCT sa.author_name, 'Unknown'
+        FROM staging_authorship sa
+        JOIN staging_publications sp ON sp.seq = sa.seq
+        JOIN staging_inserted si ON si.id = sp.id
+        ORDER BY sa.author_name
+        ON CONFLICT (name) DO NOTHING;
+
+        INSERT INTO authorship (author_id, publication_id)
+        SELECT DISTINCT COALESCE(a.canonical_id, a.id), sp.id
+        FROM staging_authorship sa
+        JOIN staging_publications sp ON sp.seq = sa.seq
+        JOIN staging_inserted si ON si.id = sp.id
+        JOIN authors a ON a.name = sa.author_name
+        ON CONFLICT DO NOTHING;
+
+        INSERT INTO categories (category_name)
+        SELECT DISTINCT spc.category_name
+        FROM staging_publication_category spc
+        JOIN staging_publications sp ON sp.seq = spc.seq
+        JOIN staging_inserted si ON si.id = sp.id
+        ORDER BY spc.category_name
+        ON CONFLICT (category_name) DO NOTHING;
+
+        INSERT INTO publication_category (publication_id, category_id)
+        SELECT DISTINCT sp.id, c.id
+        FROM staging_publication_category spc
+        JOIN staging_publications sp ON sp.seq = spc.seq
+        JOIN staging_inserted si ON si.id = sp.id
+        JOIN categories c ON c.category_name = spc.category_name
+        ON CONFLICT DO NOTHING;
+    """)
+    return inserted_count
+
+def is_line_delimited(path, sample_lines=5):
+    """Tell whether a dataset holds one JSON record per line.
+
+    .jsonl files are trusted; other files are sniffed: each of the first
+    non-blank lines, stripped of array brackets and commas, must decode to a
+    record. Compact or indented JSON arrays fail the check.
+    """
+    if path.endswith('.jsonl'):
+        return True
+    checked = 0
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip().lstrip('[,').rstrip('],').strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                return False
+            if not isinstance(record, dict):
+                return False
+            checked += 1
+            if checked >= sample_lines:
+                break
+    return checked > 0
+
+def plan_shards(path, shard_count):
+    """Split a dataset into byte ranges for parallel loading.
+
+    Byte-range shards require one record per line, as in the arXiv snapshot;
+    other layouts are loaded as one shard. Compressed files cannot be seeked
+    cheaply and are loaded as one shard too.
+    """
+    if shard_count <= 1 or path.endswith(('.gz', '.bz2')):
+        return [(0, None)]
+    if not is_line_delimited(path):
+        logging.info(f"{path} is not one record per line, loading it as a single shard")
+        return [(0, None)]
+    size = os.path.getsize(path)
+    starts = [size * i // shard_count for i in range(shard_count)]
+    ends = starts[1:] + [size]
+    return [(start, end) for start, end in zip(starts, ends) if end > start]
+
+def iter_shard_records(path, start, end):
+    """Yield the records whose line starts within the byte range [start, end)."""
+    if end is None:
+        yield from iter_records(path)
+        return
+    with open(path, 'rb') as file:
+        if start > 0:
+            # The line straddling the boundary belongs to the previous shard
+            file.seek(start - 1)
+            file.readline()
+        while file.tell() < end:
+            line = file.readline()
+            if not line:
+                break
+            line = line.strip().lstrip(b'[,').rstrip(b'],').strip()
+            if line:
+                yield json.loads(line)
+
+# Errors caused by a bad record rather than by the database being unavailable
+record_errors = (psycopg2.Error, KeyError, TypeError, AttributeError)
+
+# Database errors caused by concurrent transactions or the connection, not by the record:
+# the work is retried or the error raised, the record is never dead-lettered
+transient_errors = (psycopg2.extensions.TransactionRollbackError, psycopg2.OperationalError)
+
+def load_batch(cursor, batch, bulk, full_refresh=False):
+    """Load a batch inside the current transaction; returns the number of publications inserted."""
+    if bulk:
+        cursor.execute("SAVEPOINT bulk_batch;")
+        try:
+            inserted = bulk_insert_publications(cursor, batch, full_refresh)
+            cursor.execute("RELEASE SAVEPOINT bulk_batch;")
+            return inserted
+        except transient_errors:
+            raise
+        except record_errors as e:
+            # Fall back to the row-by-row path to isolate the offending records
+            logging.warning(f"Bulk load of batch failed, retrying row by row: {e}")
+            cursor.execute("ROLLBACK TO SAVEPOINT bulk_batch;")
+
+    # Each record gets its own savepoint so a failure only discards that record
+    inserted = 0
+    for item in batch:
+        cache_marks = mark_id_caches()
+        cursor.execute("SAVEPOINT record;")
+        try:
+            if insert_publication(cursor, item, full_refresh):
+                inserted += 1
+            cursor.execute("RELEASE SAVEPOINT record;")
+        except transient_errors:
+            raise
+        except record_errors as e:
+            logging.error(f"Database error while processing item {item.get('id')}: {e}")
+            cursor.execute("ROLLBACK TO SAVEPOINT record;")
+            rollback_id_caches(cache_marks)
+            reject_record(cursor, item, e)
+    return inserted
+
+def reject_record(cursor, item, error):
+    """Store a record that could not be loaded in the dead-letter table with its error."""
+    metrics.incr('records_rejected')
+    cursor.execute("""
+        INSERT INTO rejected_records (source_id, record, error)
+        VALUES (%s, %s, %s);
+    """, (item.get('id'), psycopg2.extras.Json(item), str(error).strip()))
+
+def load_shard(read_records, shard, watermark, batch_size, batch_bytes, bulk, full_refresh=False):
+    """Load the records yielded by read_records() on its own connection, committing after every batch.
+
+    shard describes the slice of the input in the audit summary. Returns the
+    number of records read and the newest update_date seen.
+    """
+    record_count = 0
+    newest_update = watermark
     try:
-        with psycopg2.connect(**db_params) as conn:
+        with db_connection() as conn:
             with conn.cursor() as cursor:
-                # Load and process JSON data
-                try:
-                    with open('/mnt/c/Users/Autre/Desktop/dataengineering/dataset.json', 'r') as file:
-                        data = json.load(file)
-                except FileNotFoundError as e:
-                    logging.error(f"JSON file not found: {e}")
-                    return  # Exit the function if file not found
-                except json.JSONDecodeError as e:
-                    logging.error(f"Error decoding JSON: {e}")
-                    return  # Exit the function if JSON is invalid
-
-                # Insert JSON data into the database
-                for item in data:
-                    try:
-                        current_date = datetime.now().date()
-                        cursor.execute("""
-                            INSERT INTO publications (submitter, title, comments, journal_ref, doi, report_no, categories, license, abstract, update_date)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                            ON CONFLICT (doi) DO NOTHING
-                            RETURNING id;
-                        """, (item["submitter"], item["title"], item["comments"], item["journal-ref"], item["doi"], item["report-no"], item["categories"], item["license"], item["abstract"], current_date))
-                        publication_id = cursor.fetchone()[0] if cursor.rowcount else None
-
-                        if publication_id:
-                            authors_data = [(get_or_insert_author_id(cursor, name), publication_id) for name in item["authors"].split(', ')]
-                            psycopg2.extras.execute_values(cursor, "INSERT INTO authorship (author_id, publication_id) VALUES %s ON CONFLICT DO NOTHING;", authors_data)
-                            
-                            categories_data = [(publication_id, get_or_insert_category_id(cursor, category)) for category in item["categories"].split()]
-                            psycopg2.extras.execute_values(cursor, "INSERT INTO publication_category (publication_id, category_id) VALUES %s ON CONFLICT DO NOTHING;", categories_data)
-
-                    except psycopg2.Error as e:
-                        logging.error(f"Database error while processing item {item['doi']}: {e}")
-                        conn.rollback()  # Rolling back the transaction in case of an error
-                        continue  # Continue with the next item in case of an error
+                if bulk:
+                    create_staging_tables(cursor)
+                records = (item for item in read_records()
+                           if not watermark or (item.get('update_date') or '') >= watermark)
+                for batch in iter_batches(records, batch_size, batch_bytes):
+                    newest_update = max([newest_update or ''] + [item.get('update_date') or '' for item in batch]) or None
+                    for attempt in range(1, insert_batch_max_attempts + 1):
+                        cache_marks = mark_id_caches()
+                        try:
+                            if not audit_bulk_loads:
+                                pause_audit(cursor)
+                            with metrics.timer('load_batch_seconds'):
+                                inserted = load_batch(cursor, batch, bulk, full_refresh)
+                                conn.commit()
+                            break
+                        except psycopg2.extensions.TransactionRollbackError as e:
+                            # Lost a deadlock or serialization conflict: the whole batch is retried
+                            conn.rollback()
+                            rollback_id_caches(cache_marks)
+                            if attempt == insert_batch_max_attempts:
+                                raise
+                            metrics.incr('load_batch_retries')
+                            logging.warning(f"Batch of shard {shard} rolled back ({e.pgcode}), retrying: {e}")
+                            time.sleep(random.uniform(0, 0.5 * attempt))
+                    commit_id_caches()
+                    record_count += len(batch)
+                    metrics.incr('records_read', len(batch))
+                    metrics.incr('publications_inserted', inserted)
+
+                if not audit_bulk_loads and record_count:
+                    log_bulk_operation(cursor, 'BULK INSERT', {'records': record_count, 'shard': shard})
+                    conn.commit()
+    except Exception:
+        rollback_id_caches()
+        raise
+    log_id_cache_stats()
+    return record_count, newest_update
 
+def load_shard_in_worker(*args):
+    """Run load_shard in a pool worker and return its result with the worker's metrics."""
+    metrics.reset()  # Forked from the parent: count only this shard's work
+    return load_shard(*args), metrics.snapshot()
+
+@instrumented_task
+def insert_data(batch_size=insert_batch_size, batch_bytes=insert_batch_bytes, bulk=insert_bulk, warm_cache=False, workers=insert_workers, **context):
+    try:
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                # Only records updated since the last run are loaded, unless a full refresh is requested;
+                # a full refresh also rewrites the publications it reads
+                full_refresh = is_full_refresh(context)
+                watermark = get_watermark(cursor, 'insert_data', full_refresh)
+                # Digests of the staged Parquet partitions already loaded
+                loaded_partitions = get_watermark(cursor, 'insert_data_partitions', full_refresh) or {}
+                if warm_cache:
+                    warm_id_caches(cursor)  # Inherited by the forked shard workers
+        close_db_pool()  # Not shared with the forked workers
+
+        # Stream the records shard by shard, each shard on its own connection
+        try:
+            partition_digests = None
+            if stage_to_parquet:
+                shards, partition_digests = plan_parquet_shards(parquet_staging_dir, loaded_partitions, watermark, workers)
+            else:
+                shards = [(functools.partial(iter_shard_records, dataset_path, start, end), [start, end])
+                          for start, end in plan_shards(dataset_path, workers)]
+            if len(shards) <= 1:
+                results = [load_shard(read_records, shard, watermark, batch_size, batch_bytes, bulk, full_refresh)
+                           for read_records, shard in shards]
+            else:
+                with ProcessPoolExecutor(max_workers=len(shards), mp_context=multiprocessing.get_context('fork')) as executor:
+                    futures = [executor.submit(load_shard_in_worker, read_records, shard, watermark, batch_size, batch_bytes, bulk, full_refresh)
+                               for read_records, shard in shards]
+                    results = []
+                    for future in futures:
+                        result, worker_metrics = future.result()
+                        metrics.merge(worker_metrics)
+                        results.append(result)
+        except FileNotFoundError as e:
+            logging.error(f"JSON file not found: {e}")
+            return  # Exit the function if file not found
+        except (json.JSONDecodeError, ValueError) as e:
+            logging.error(f"Error decoding JSON: {e}")
+            return  # Exit the function if JSON is invalid
+
+        newest_update = max([watermark or ''] + [newest or '' for _, newest in results]) or None
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                if newest_update:
+                    set_watermark(cursor, 'insert_data', newest_update)
+                if partition_digests is not None:
+                    set_watermark(cursor, 'insert_data_partitions', partition_digests)
                 conn.commit()
-                logging.info("Data insertion completed successfully.")
+        logging.info(f"Data insertion completed successfully: {sum(count for count, _ in results)} records from {len(shards)} shard(s).")
 
     except psycopg2.Error as e:
         logging.error(f"Database connection error: {e}")
+        raise
+
+
+### PARQUET STAGING
+
+# Records converted to one Arrow record batch while staging
+parquet_batch_size = 50000
+
+def import_pyarrow():
+    """pyarrow is only needed for Parquet staging, so it is imported on first use."""
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet staging requires pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+def parquet_schema(pa):
+    # Low-cardinality strings are dictionary-encoded in memory and on disk
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('arxiv_id', pa.string()),
+        ('submitter', pa.string()),
+        ('title', pa.string()),
+        ('comments', pa.string()),
+        ('journal_ref', pa.string()),
+        ('doi', pa.string()),
+        ('report_no', pa.string()),
+        ('categories', dictionary),
+        ('license', dictionary),
+        ('abstract', pa.string()),
+        ('update_date', pa.date32()),
+        ('latest_version', dictionary),
+        ('authors', pa.list_(dictionary)),
+        ('update_month', pa.string()),
+        ('primary_category', pa.string()),
+    ])
+
+def parquet_partition_key(update_month, primary_category):
+    """Relative directory of a partition, as laid out by hive partitioning."""
+    return f"update_month={update_month}/primary_category={primary_category}"
+
+def records_to_arrow(pa, schema, batch, partitions):
+    """Convert a batch of raw records to an Arrow record batch.
+
+    partitions maps each partition key to its row count and a running digest
+    of the (id, update_date, version) of its records, which tells later runs
+    whether the partition changed.
+    """
+    today = datetime.now().date()
+    columns = {name: [] for name in schema.names}
+    for item in batch:
+        update_date = parse_update_date(item.get("update_date"), today)
+        codes = (item.get("categories") or '').split()
+        version = latest_version(item.get("versions"))
+        columns['arxiv_id'].append(item.get("id"))
+        columns['submitter'].append(item.get("submitter"))
+        columns['title'].append(item.get("title"))
+        columns['comments'].append(item.get("comments"))
+        columns['journal_ref'].append(item.get("journal-ref"))
+        columns['doi'].append(item.get("doi"))
+        columns['report_no'].append(item.get("report-no"))
+        columns['categories'].append(item.get("categories"))
+        columns['license'].append(item.get("license"))
+        columns['abstract'].append(item.get("abstract"))
+        columns['update_date'].append(update_date)
+        columns['latest_version'].append(version)
+        columns['authors'].append(parse_authors(item))
+        columns['update_month'].append(f"{update_date:%Y-%m}")
+        columns['primary_category'].append(codes[0] if codes else 'unknown')
+
+        key = parquet_partition_key(columns['update_month'][-1], columns['primary_category'][-1])
+        partition = partitions.get(key)
+        if partition is None:
+            partition = partitions[key] = {'update_month': columns['update_month'][-1], 'rows': 0, 'hasher': hashlib.blake2b(digest_size=16)}
+        partition['rows'] += 1
+        partition['hasher'].update(f"{item.get('id')}\t{update_date}\t{version}\n".encode('utf-8'))
+    return pa.RecordBatch.from_pydict(columns, schema=schema)
+
+def read_parquet_manifest(directory):
+    try:
+        with open(os.path.join(directory, '_manifest.json'), encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+def write_parquet_manifest(directory, manifest):
+    path = os.path.join(directory, '_manifest.json')
+    with open(path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def swap_parquet_partitions(incoming, directory, old_partitions, new_partitions):
+    """Move rewritten partitions from incoming into directory, leaving unchanged ones untouched.
+
+    Returns the number of partitions replaced.
+    """
+    replaced = 0
+    for key, entry in new_partitions.items():
+        target = os.path.join(directory, key)
+        if old_partitions.get(key, {}).get('digest') == entry['digest'] and os.path.isdir(target):
+            continue
+        shutil.rmtree(target, ignore_errors=True)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(os.path.join(incoming, key), target)
+        replaced += 1
+    for key in old_partitions.keys() - new_partitions.keys():
+        target = os.path.join(directory, key)
+        shutil.rmtree(target, ignore_errors=True)
+        try:
+            os.rmdir(os.path.dirname(target))  # Only succeeds once the month is empty
+        except OSError:
+            pass
+    shutil.rmtree(incoming, ignore_errors=True)
+    return replaced
+
+@instrumented_task
+def stage_parquet(**context):
+    """Convert the raw dataset into Parquet partitioned by update month and primary category.
+
+    The run is skipped when the source file is unchanged since the last one,
+    and partitions whose records did not change keep their existing files.
+    """
+    if not stage_to_parquet:
+        logging.info("Parquet staging is disabled, set STAGE_TO_PARQUET=1 to enable it.")
+        return {'skipped': True}
+    pa = import_pyarrow()
+    stat = os.stat(dataset_path)
+    source = {'path': os.path.abspath(dataset_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    manifest = read_parquet_manifest(parquet_staging_dir) or {'partitions': {}}
+    if manifest.get('source') == source and not is_full_refresh(context):
+        logging.info(f"Dataset unchanged since the last staging run, keeping {len(manifest['partitions'])} partitions.")
+        return {'skipped': True, 'partitions': len(manifest['partitions'])}
+
+    incoming = parquet_staging_dir + '.incoming'
+    shutil.rmtree(incoming, ignore_errors=True)
+    schema = parquet_schema(pa)
+    partitions = {}
+    batches = (records_to_arrow(pa, schema, batch, partitions)
+               for batch in iter_batches(iter_records(dataset_path), parquet_batch_size))
+    with metrics.timer('parquet_write_seconds'):
+        pa.dataset.write_dataset(
+            batches, incoming, schema=schema, format='parquet',
+            partitioning=pa.dataset.partitioning(pa.schema([('update_month', pa.string()), ('primary_category', pa.string())]), flavor='hive'),
+            file_options=pa.dataset.ParquetFileFormat().make_write_options(compression='zstd', use_dictionary=True),
+            basename_template='part-{i}.parquet',
+            max_partitions=1 << 16,
+        )
+
+    new_partitions = {key: {'update_month': partition['update_month'], 'rows': partition['rows'],
+                            'digest': partition['hasher'].hexdigest()}
+                      for key, partition in partitions.items()}
+    os.makedirs(parquet_staging_dir, exist_ok=True)
+    replaced = swap_parquet_partitions(incoming, parquet_staging_dir, manifest['partitions'], new_partitions)
+    write_parquet_manifest(parquet_staging_dir, {'source': source, 'partitions': new_partitions})
+
+    records = sum(partition['rows'] for partition in new_partitions.values())
+    metrics.incr('records_read', records)
+    metrics.incr('parquet_partitions_written', replaced)
+    logging.info(f"Staged {records} records as Parquet: {replaced} of {len(new_partitions)} partitions rewritten.")
+    return {'records': records, 'partitions': len(new_partitions), 'partitions_rewritten': replaced}
+
+def plan_parquet_shards(directory, loaded_partitions, watermark, shard_count):
+    """Split the staged files that still need loading into shards for load_shard.
+
+    Partitions whose digest matches loaded_partitions, or whose month is older
+    than the update_date watermark, are skipped without being read. Returns
+    the shards and the current partition digests, to store once they are loaded.
+    """
+    manifest = read_parquet_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"No Parquet staging manifest in {directory}, run stage_parquet first")
+    digests = {key: entry['digest'] for key, entry in manifest['partitions'].items()}
+    pending = [key for key, entry in sorted(manifest['partitions'].items())
+               if loaded_partitions.get(key) != entry['digest']
+               and (not watermark or entry['update_month'] >= watermark[:7])]
+    files = sorted(path for key in pending for path in glob.glob(os.path.join(directory, key, '*.parquet')))
+    logging.info(f"Loading {len(pending)} of {len(digests)} staged partitions ({len(files)} files).")
+    shards = []
+    for index in range(min(shard_count, len(files))):
+        shard_files = files[index::shard_count]
+        shards.append((functools.partial(iter_parquet_records, shard_files), {'parquet_files': len(shard_files)}))
+    return shards, digests
+
+def iter_parquet_records(files):
+    """Yield snapshot-shaped records from staged Parquet files, reading only the loaded columns."""
+    pa = import_pyarrow()
+    columns = [name for name in parquet_schema(pa).names
+               if name not in ('update_month', 'primary_category') and (store_abstracts or name != 'abstract')]
+    dataset = pa.dataset.dataset(files, format='parquet')
+    for batch in dataset.to_batches(columns=columns, batch_size=insert_batch_size):
+        for row in batch.to_pylist():
+            yield {
+                'id': row['arxiv_id'],
+                'submitter': row['submitter'],
+                'title': row['title'],
+                'comments': row['comments'],
+                'journal-ref': row['journal_ref'],
+                'doi': row['doi'],
+                'report-no': row['report_no'],
+                'categories': row['categories'],
+                'license': row['license'],
+                'abstract': row.get('abstract'),
+                'update_date': row['update_date'].isoformat(),
+                'versions': [{'version': row['latest_version']}] if row['latest_version'] else [],
+                'authors': row['authors'] or [],
+            }
+
+def open_parquet_staging(directory=None):
+    """Open the staged Parquet files as an Arrow dataset for analytical reads.
+
+    Filters on update_month and primary_category prune whole partitions, and
+    only the requested columns are read:
+
+        open_parquet_staging().to_table(columns=['title', 'authors'],
+                                        filter=pyarrow.dataset.field('primary_category') == 'cs.LG')
+    """
+    pa = import_pyarrow()
+    return pa.dataset.dataset(directory or parquet_staging_dir, format='parquet', partitioning='hive')
 
 
 ### DATA CLEANING
 
 
-def remove_short_titles_and_empty_authors(cursor):
+# Rows deleted or updated per transaction by the cleaning steps
+clean_batch_size = 10000
+
+def delete_publications_batched(conn, cursor, condition, batch_size=clean_batch_size):
+    """Delete publications matching condition together with their dependent rows.
+
+    Candidates are walked in id order, one batch per transaction, so locks and
+    WAL stay bounded. Returns the number of publications deleted.
+    """
+    deleted = 0
+    last_id = 0
+    while True:
+        pause_audit(cursor)
+        cursor.execute(f"""
+            WITH doomed AS (
+                SELECT p.id FROM publications p
+                WHERE p.id > %s AND ({condition})
+                ORDER BY p.id
+                LIMIT %s
+            ), deleted_categories AS (
+                DELETE FROM publication_category pc USING doomed d WHERE pc.publication_id = d.id
+            ), deleted_citations AS (
+                DELETE FROM citations c USING doomed d WHERE c.publication_id = d.id
+            ), deleted_citing_edges AS (
+                DELETE FROM citation_edges e USING doomed d WHERE e.publication_id = d.id
+            ), deleted_cited_edges AS (
+                DELETE FROM citation_edges e USING doomed d WHERE e.cited_id = d.id
+            ), deleted_neighbourhoods AS (
+                DELETE FROM citation_neighbourhoods n USING doomed d WHERE n.publication_id = d.id
+            ), deleted_work AS (
+                DELETE FROM work_queue q USING doomed d WHERE q.publication_id = d.id
+            ), deleted_authorship AS (
+                DELETE FROM authorship ap USING doomed d WHERE ap.publication_id = d.id
+            )
+            DELETE FROM publications p USING doomed d
+            WHERE p.id = d.id
+            RETURNING p.id;
+        """, (last_id, batch_size))
+        ids = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+        deleted += len(ids)
+        metrics.incr('publications_deleted', len(ids))
+        if len(ids) < batch_size:
+            return deleted
+        last_id = max(ids)
+
+def remove_short_titles_and_empty_authors(conn, cursor):
+    removed = {}
     try:
         # Deleting publications with short titles
-        cursor.execute("""
-            DELETE FROM publications 
-            WHERE char_length(trim(title)) < 2;
-        """)
+        removed['short_titles'] = delete_publications_batched(conn, cursor, "char_length(trim(p.title)) < 2")
 
-        # Assuming you want to delete publications without associated authors
-        cursor.execute("""
-            DELETE FROM publications 
-            WHERE id NOT IN (SELECT publication_id FROM authorship);
-        """)
+        # Deleting publications without associated authors
+        removed['without_authors'] = delete_publications_batched(
+            conn, cursor, "NOT EXISTS (SELECT 1 FROM authorship ap WHERE ap.publication_id = p.id)")
+
+        log_bulk_operation(cursor, 'BULK DELETE', removed)
+        conn.commit()
     except Exception as e:
+        conn.rollback()
         logging.error(f"Error in remove_short_titles_and_empty_authors: {e}")
+    return removed
+
+def drop_abstracts(conn, cursor, batch_size=clean_batch_size):
+    """Clear abstracts left over from loads that still stored them.
 
-def drop_abstracts(cursor):
+    New loads do not store abstracts (see store_abstracts), so this is a no-op
+    once older rows have been cleared. Returns the number of rows updated.
+    """
+    cleared = 0
+    last_id = 0
     try:
-        cursor.execute("""
-            ALTER TABLE publications 
-            DROP COLUMN abstract;
-        """)
+        while True:
+            pause_audit(cursor)
+            cursor.execute("""
+                UPDATE publications SET abstract = NULL
+                WHERE id IN (
+                    SELECT id FROM publications
+                    WHERE id > %s AND abstract IS NOT NULL
+                    ORDER BY id
+                    LIMIT %s
+                )
+                RETURNING id;
+            """, (last_id, batch_size))
+            ids = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+            cleared += len(ids)
+            metrics.incr('abstracts_cleared', len(ids))
+            if len(ids) < batch_size:
+                break
+            last_id = max(ids)
+
+        if cleared:
+            log_bulk_operation(cursor, 'BULK CLEAR ABSTRACT', {'abstracts': cleared})
+            conn.commit()
     except Exception as e:
+        conn.rollback()
         logging.error(f"Error in drop_abstracts: {e}")
+    return cleared
 
 
-
+@instrumented_task
 def clean_data():
     try:
-        with psycopg2.connect(**db_params) as conn:
+        with db_connection() as conn:
             with conn.cursor() as cursor:
-                remove_short_titles_and_empty_authors(cursor)
-                drop_abstracts(cursor)
-                conn.commit()
+                report = {}
+
+                started = time.monotonic()
+                removed = remove_short_titles_and_empty_authors(conn, cursor)
+                report.update(removed)
+                logging.info(f"Removed publications {removed} in {time.monotonic() - started:.2f}s")
+
+                started = time.monotonic()
+                report['abstracts_cleared'] = drop_abstracts(conn, cursor)
+                logging.info(f"Cleared {report['abstracts_cleared']} abstracts in {time.monotonic() - started:.2f}s")
+
+                try:
+                    report.update(maintain_audit_log(cursor))
+                    conn.commit()
+                except psycopg2.Error as e:
+                    conn.rollback()
+                    logging.error(f"Error in maintain_audit_log: {e}")
+
                 logging.info("Data cleaning completed successfully.")
+                return report
     except Exception as e:
         logging.error(f"An error occurred during data cleaning: {e}")
 
@@ -135,130 +1618,641 @@ def clean_data():
 
 
 
-# Cache for DOI data
-doi_cache = {}
+# SerpApi client settings; point SERPAPI_BASE_URL at a stub server to run offline
+serpapi_base_url = os.environ.get('SERPAPI_BASE_URL', 'https://serpapi.com/search')
+serpapi_api_key = os.environ.get('SERPAPI_API_KEY', "2fbeb8192002fda3306b06b36e3916985438282825bfc1c67862e7f2811bfb6a")
+serpapi_max_workers = 8  # Concurrent in-flight requests
+serpapi_requests_per_second = 5.0  # Sustained rate allowed by the API plan
+serpapi_burst = 10
+serpapi_timeout = 30
+serpapi_fanout_size = 200  # Queries dispatched together, bounds results held in memory
+
+# Parsed Scholar results and citations of a claim are written in multi-row statements of this size
+enrichment_batch_size = 500
+
+# Persistent Scholar response cache, shared by every task and DAG run on the worker
+scholar_cache_path = os.environ.get('SCHOLAR_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'publication_etl_scholar_cache.sqlite'))
+scholar_cache_ttl = 30 * 24 * 3600  # Seconds before a cached response is refetched
+scholar_cache_max_entries = 500000
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting the request rate across all workers.
+
+    A 429 response pauses the whole bucket, so every worker backs off together
+    instead of each one hammering the API on its own schedule.
+    """
 
-def make_google_scholar_request(params):
-    base_url = 'https://serpapi.com/search'
-    for attempt in range(5):
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def backoff(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+serpapi_rate_limiter = TokenBucket(serpapi_requests_per_second, serpapi_burst)
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """Return the process-wide pooled HTTP session, creating it on first use."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=serpapi_max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_session = session
+        return _http_session
+
+def make_google_scholar_request(params, max_attempts=5):
+    session = get_http_session()
+    for attempt in range(max_attempts):
+        if attempt:
+            metrics.incr('http_retries')
+        with metrics.timer('rate_limit_wait_seconds'):
+            serpapi_rate_limiter.acquire()
         try:
-            response = requests.get(base_url, params=params)
+            metrics.incr('http_requests')
+            with metrics.timer('http_request_seconds'):
+                response = session.get(serpapi_base_url, params=params, timeout=serpapi_timeout)
+            if response.status_code == 429:
+                metrics.incr('http_429')
+                retry_after = response.headers.get('Retry-After', '')
+                delay = float(retry_after) if retry_after.isdigit() else 2 ** attempt
+                logging.warning(f"Rate limit hit. Retrying in {delay}s...")
+                serpapi_rate_limiter.backoff(delay)
+                continue
             response.raise_for_status()
             return response.json()
-        except requests.exceptions.HTTPError as e:
-            if response.status_code == 429:
-                logging.warning("Rate limit hit. Retrying...")
-                time.sleep(2 ** attempt)
-            else:
-                raise e
         except requests.exceptions.RequestException as e:
+            metrics.incr('http_errors')
             logging.error(f"Request failed: {e}")
             break
     return None
 
 
 
-def select_papers_from_categories(cursor, limit_per_category=2):
+def select_papers_from_categories(cursor, limit_per_category=2, last_ids=None):
+    """Pick the next papers of each category after the ids recorded in last_ids.
+
+    last_ids maps category name -> last selected publication id and is
+    advanced in place, so successive calls move forward through each category.
+    All categories are served by one query that walks the
+    (category_id, publication_id) index of publication_category.
+    """
+    if last_ids is None:
+        last_ids = {}
     cursor.execute("""
-        SELECT category_name FROM categories;
-    """)
-    categories = cursor.fetchall()
-    selected_papers = []
+        SELECT c.category_name, p.id, p.title, p.categories
+        FROM categories c
+        CROSS JOIN LATERAL (
+            SELECT pc.publication_id
+            FROM publication_category pc
+            WHERE pc.category_id = c.id
+              AND pc.publication_id > COALESCE((%s::jsonb ->> c.category_name)::int, 0)
+            ORDER BY pc.publication_id
+            LIMIT %s
+        ) picked
+        JOIN publications p ON p.id = picked.publication_id
+        ORDER BY p.id;
+    """, (json.dumps(last_ids), limit_per_category))
 
-    for category in categories:
-        cursor.execute("""
-            SELECT id, title, categories FROM publications
-            WHERE categories LIKE %s
-            ORDER BY id
-            LIMIT %s;
-        """, ('%' + category[0] + '%', limit_per_category))
-        papers = cursor.fetchall()
-        selected_papers.extend(papers)
+    selected_papers = []
+    seen_ids = set()
+    for category_name, publication_id, title, categories in cursor.fetchall():
+        last_ids[category_name] = max(last_ids.get(category_name, 0), publication_id)
+        # A paper listed in several categories is only enriched once
+        if publication_id not in seen_ids:
+            seen_ids.add(publication_id)
+            selected_papers.append((publication_id, title, categories))
 
     return selected_papers
 
+def normalize_query(query):
+    """Canonicalize a query so trivially different spellings share a cache entry."""
+    query = unicodedata.normalize('NFKC', query).casefold()
+    return ' '.join(query.split()).strip(' .,;:')
+
+
+class ScholarCache:
+    """SQLite-backed cache of SerpApi responses keyed by normalized query.
+
+    Entries expire after ttl seconds and the least recently used ones are
+    evicted once the table grows past max_entries. SQLite file locking makes
+    the cache safe to share between concurrent task processes.
+    """
+
+    def __init__(self, path, ttl, max_entries, evict_every=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self.writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS scholar_responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_scholar_responses_accessed_at ON scholar_responses (accessed_at);")
+
+    @staticmethod
+    def make_key(params):
+        key_params = {k: v for k, v in params.items() if k != 'api_key'}
+        key_params['q'] = normalize_query(str(key_params.get('q', '')))
+        return hashlib.sha1(json.dumps(key_params, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, params):
+        key = self.make_key(params)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT response, created_at FROM scholar_responses WHERE key = ?;", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                metrics.incr('scholar_cache_misses')
+                return None
+            self.conn.execute("UPDATE scholar_responses SET accessed_at = ? WHERE key = ?;", (now, key))
+            self.hits += 1
+        metrics.incr('scholar_cache_hits')
+        return json.loads(row[0])
+
+    def put(self, params, response):
+        key = self.make_key(params)
+        now = time.time()
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO scholar_responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET response = excluded.response, created_at = excluded.created_at, accessed_at = excluded.accessed_at;
+            """, (key, json.dumps(response), now, now))
+            self.writes += 1
+            if self.writes % self.evict_every == 0:
+                self.evict(now)
+
+    def evict(self, now):
+        self.conn.execute("DELETE FROM scholar_responses WHERE created_at < ?;", (now - self.ttl,))
+        self.conn.execute("""
+            DELETE FROM scholar_responses WHERE key IN (
+                SELECT key FROM scholar_responses ORDER BY accessed_at
+                LIMIT max((SELECT COUNT(*) FROM scholar_responses) - ?, 0)
+            );
+        """, (self.max_entries,))
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def log_stats(self):
+        logging.info(f"Scholar cache: {self.hits} hits, {self.misses} misses, hit rate {self.hit_rate():.1%}")
+
+
+_scholar_cache = None
+_scholar_cache_lock = threading.Lock()
+
+def get_scholar_cache():
+    """Return the process-wide Scholar cache, opening it on first use."""
+    global _scholar_cache
+    with _scholar_cache_lock:
+        if _scholar_cache is None:
+            _scholar_cache = ScholarCache(scholar_cache_path, scholar_cache_ttl, scholar_cache_max_entries)
+        return _scholar_cache
+
 # Function to query Google Scholar using serpapi
 def query_google_scholar(query):
-    api_key = "2fbeb8192002fda3306b06b36e3916985438282825bfc1c67862e7f2811bfb6a"  # API key is read from an environment variable
-    base_url = 'https://serpapi.com/search'
     params = {
         'engine': 'google_scholar',
         'q': query,
         'start': 0,
         'num': 2,
-        'api_key': api_key,
+        'api_key': serpapi_api_key,
         'hl': 'en'
     }
-
-    try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logging.error(f"HTTP request to SerpApi failed: {e}")
-        return None
+    cache = get_scholar_cache()
+    cached = cache.get(params)
+    if cached is not None:
+        return cached
+
+    response = make_google_scholar_request(params)
+    if response is not None:
+        cache.put(params, response)
+    return response
+
+def query_google_scholar_many(queries, max_workers=serpapi_max_workers):
+    """Run query_google_scholar for each query concurrently, preserving order."""
+    queries = list(queries)
+    if not queries:
+        return []
+    with metrics.timer('scholar_fanout_seconds'), \
+            ThreadPoolExecutor(max_workers=min(max_workers, len(queries))) as executor:
+        return list(executor.map(query_google_scholar, queries))
+
+
+class StubScholarHandler(BaseHTTPRequestHandler):
+    """Serves deterministic SerpApi-shaped responses for offline runs and benchmarks."""
+
+    latency = 0.0
+    error_rate = 0.0
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query).get('q', [''])[0]
+        time.sleep(self.latency)
+        throttled = random.random() < self.error_rate
+        with self.server.count_lock:
+            self.server.request_count += 1
+            self.server.throttled_count += throttled
+        if throttled:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.end_headers()
+            return
+
+        rng = random.Random(hashlib.md5(query.encode('utf-8')).hexdigest())
+        authors = [{'name': f"Author {rng.randint(1, 5000)}"} for _ in range(rng.randint(1, 4))]
+        entry_type = rng.choice(['article', 'inproceedings', 'book', 'phdthesis', 'misc'])
+        body = {
+            'organic_results': [{
+                'title': f"{query} (result {position})",
+                'link': f"https://example.org/{rng.getrandbits(32):08x}",
+                'result_id': f"{rng.getrandbits(48):012x}",
+                'snippet': '',
+                'publication_info': {
+                    'summary': f"{authors[0]['name']} - Stub Journal, {rng.randint(1990, 2023)}",
+                    'authors': authors,
+                },
+            } for position in range(2)],
+            'results': [{
+                'bib_entry': f"@{entry_type}{{stub{rng.getrandbits(16)}, title={{{query}}}}}",
+                'authors': [author['name'] for author in authors],
+            }],
+        }
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_scholar_server(host='127.0.0.1', port=0, latency=0.05, error_rate=0.0):
+    """Start a stub SerpApi server in a background thread and point the client at it."""
+    global serpapi_base_url
+    handler = type('StubScholarHandler', (StubScholarHandler,), {'latency': latency, 'error_rate': error_rate})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.count_lock = threading.Lock()
+    server.request_count = 0
+    server.throttled_count = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    serpapi_base_url = f"http://{host}:{server.server_address[1]}/search"
+    logging.info(f"Stub SerpApi server listening on {serpapi_base_url}")
+    return server
     
 
-def enrich_publications(cycle=2):
+### WORK QUEUE
+
+# Items claimed per transaction; their results and queue status commit together
+work_queue_claim_size = 100
+# Forked worker processes draining a stage; more workers or task instances can join through SKIP LOCKED
+work_queue_workers = int(os.environ.get('WORK_QUEUE_WORKERS', '1'))
+# Publications queued per statement
+work_queue_enqueue_batch_size = 10000
+# A failed item is retried after work_queue_backoff * 2 ** (attempts - 1) seconds, capped
+work_queue_backoff = 60
+work_queue_max_backoff = 6 * 3600
+# Items failing this many times are marked failed and no longer claimed
+work_queue_max_attempts = 5
+# Attempts at a claim that loses a deadlock or serialization conflict to another worker
+work_queue_claim_max_attempts = 3
+
+# Stage name -> function processing claimed items, registered with @work_queue_stage
+work_queue_processors = {}
+
+def work_queue_stage(stage):
+    """Register the decorated function as the processor of a queue stage.
+
+    The processor is called as process_items(cursor, items) with the claimed
+    (publication_id, title, categories, attempts) tuples, writes the results
+    of the items it could process and returns {publication_id: error} for
+    the others.
+    """
+    def register(func):
+        work_queue_processors[stage] = func
+        return func
+    return register
+
+def enqueue_work(cursor, stage, publication_ids, requeue=False):
+    """Queue publications for a stage; returns the number of items added.
+
+    Items already queued keep their state, unless requeue (used by full
+    refreshes) resets them to pending.
+    """
+    if not publication_ids:
+        return 0
+    conflict = ("DO UPDATE SET status = 'pending', attempts = 0, next_retry_at = now(), last_error = NULL, updated_at = now()"
+                if requeue else "DO NOTHING")
+    rows = [(publication_id, stage) for publication_id in sorted(publication_ids)]
+    psycopg2.extras.execute_values(cursor, f"""
+        INSERT INTO work_queue (publication_id, stage) VALUES %s
+        ON CONFLICT (stage, publication_id) {conflict};
+    """, rows, page_size=len(rows))
+    metrics.incr(f"{stage}_items_enqueued", cursor.rowcount)
+    return cursor.rowcount
+
+def claim_work(cursor, stage, limit):
+    """Lock up to limit ready items of a stage that no other worker holds.
+
+    The row locks last until the transaction ends, so the items of a worker
+    that crashes are released and claimed again by the next one.
+    """
+    cursor.execute("""
+        SELECT q.publication_id, p.title, p.categories, q.attempts
+        FROM work_queue q
+        JOIN publications p ON p.id = q.publication_id
+        WHERE q.stage = %s AND q.status = 'pending' AND q.next_retry_at <= now()
+        ORDER BY q.next_retry_at, q.publication_id
+        LIMIT %s
+        FOR UPDATE OF q SKIP LOCKED;
+    """, (stage, limit))
+    return cursor.fetchall()
+
+def complete_work(cursor, stage, publication_ids):
+    if publication_ids:
+        cursor.execute("""
+            UPDATE work_queue
+            SET status = 'done', last_error = NULL, updated_at = now()
+            WHERE stage = %s AND publication_id = ANY(%s);
+        """, (stage, publication_ids))
+
+def work_queue_retry_delay(attempts):
+    """Seconds before the next attempt: exponential in the attempts made, capped and jittered."""
+    delay = min(work_queue_max_backoff, work_queue_backoff * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+def fail_work(cursor, stage, failures):
+    """Schedule failed (publication_id, attempts, error) items for a retry, or give up on them."""
+    if not failures:
+        return
+    rows = [(publication_id, stage, error, work_queue_retry_delay(attempts + 1))
+            for publication_id, attempts, error in failures]
+    psycopg2.extras.execute_values(cursor, f"""
+        UPDATE work_queue q
+        SET attempts = q.attempts + 1,
+            status = CASE WHEN q.attempts + 1 >= {work_queue_max_attempts:d} THEN 'failed' ELSE 'pending' END,
+            next_retry_at = now() + v.delay::float8 * INTERVAL '1 second',
+            last_error = v.error,
+            updated_at = now()
+        FROM (VALUES %s) AS v (publication_id, stage, error, delay)
+        WHERE q.stage = v.stage AND q.publication_id = v.publication_id;
+    """, rows, page_size=len(rows))
+
+def process_items_one_by_one(cursor, stage, process_items, items):
+    """Process items under a savepoint each, so an error only fails the item that raised it."""
+    errors = {}
+    for item in items:
+        cache_marks = mark_id_caches()
+        cursor.execute("SAVEPOINT work_item;")
+        try:
+            errors.update(process_items(cursor, [item]))
+            cursor.execute("RELEASE SAVEPOINT work_item;")
+        except transient_errors:
+            raise
+        except record_errors as e:
+            logging.error(f"Error while processing {stage} item {item[0]}: {e}")
+            cursor.execute("ROLLBACK TO SAVEPOINT work_item;")
+            rollback_id_caches(cache_marks)
+            errors[item[0]] = str(e).strip()
+    return errors
+
+def drain_work_queue(stage, claim_size=work_queue_claim_size):
+    """Claim, process and checkpoint items of a stage until none is ready; returns (done, failed).
+
+    Results and queue status commit in one transaction per claim, so an
+    interrupted run only loses the claim in flight, whose items are still
+    pending when the work resumes. A claim rolled back by a deadlock or
+    serialization conflict is claimed and processed again.
+    """
+    process_items = work_queue_processors[stage]
+    done = 0
+    failed = 0
+    while True:
+        for attempt in range(1, work_queue_claim_max_attempts + 1):
+            claim_marks = mark_id_caches()
+            try:
+                with db_connection() as conn:
+                    with conn.cursor() as cursor:
+                        items = claim_work(cursor, stage, claim_size)
+                        if not items:
+                            return done, failed
+                        cache_marks = mark_id_caches()
+                        cursor.execute("SAVEPOINT work_items;")
+                        try:
+                            errors = process_items(cursor, items)
+                            cursor.execute("RELEASE SAVEPOINT work_items;")
+                        except transient_errors:
+                            raise
+                        except record_errors as e:
+                            # Retry item by item to isolate the offending ones; Scholar responses come from the cache
+                            logging.warning(f"Processing {len(items)} {stage} items failed, retrying one by one: {e}")
+                            cursor.execute("ROLLBACK TO SAVEPOINT work_items;")
+                            rollback_id_caches(cache_marks)
+                            errors = process_items_one_by_one(cursor, stage, process_items, items)
+                        complete_work(cursor, stage, [publication_id for publication_id, _, _, _ in items if publication_id not in errors])
+                        fail_work(cursor, stage, [(publication_id, attempts, errors[publication_id])
+                                                  for publication_id, _, _, attempts in items if publication_id in errors])
+                break
+            except psycopg2.extensions.TransactionRollbackError as e:
+                # Lost a deadlock or serialization conflict: the items were released, claim again
+                rollback_id_caches(claim_marks)
+                if attempt == work_queue_claim_max_attempts:
+                    raise
+                metrics.incr('work_queue_claim_retries')
+                logging.warning(f"Claim of {stage} items rolled back ({e.pgcode}), retrying: {e}")
+                time.sleep(random.uniform(0, 0.5 * attempt))
+        commit_id_caches()
+        done += len(items) - len(errors)
+        failed += len(errors)
+        metrics.incr(f"{stage}_items_done", len(items) - len(errors))
+        metrics.incr(f"{stage}_items_failed", len(errors))
+
+def drain_in_worker(stage, workers):
+    """Run drain_work_queue in a forked worker and return its result with the worker's metrics."""
+    global serpapi_rate_limiter, _http_session, _scholar_cache
+    metrics.reset()
+    # The HTTP sockets and the SQLite handle are not shared with the parent
+    _http_session = None
+    _scholar_cache = None
+    # The workers share the API rate between them
+    serpapi_rate_limiter = TokenBucket(serpapi_requests_per_second / workers, max(serpapi_burst / workers, 1))
+    return drain_work_queue(stage), metrics.snapshot()
+
+def run_work_queue(stage, workers=work_queue_workers):
+    """Drain a stage with the given number of worker processes; returns (done, failed)."""
+    if workers <= 1:
+        return drain_work_queue(stage)
+    close_db_pool()  # Not shared with the forked workers
+    done = 0
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+        futures = [executor.submit(drain_in_worker, stage, workers) for _ in range(workers)]
+        for future in futures:
+            (worker_done, worker_failed), worker_metrics = future.result()
+            metrics.merge(worker_metrics)
+            done += worker_done
+            failed += worker_failed
+    return done, failed
+
+
+def parse_scholar_article(article, categories_str):
+    """Extract the fields written by the enrichment stage from one organic result."""
+    author_list = article.get('publication_info', {}).get('authors', [])
+    author_names = [(author_info.get('name') or '').strip() for author_info in author_list]
+    return {
+        'title': (article.get('title') or '').strip(),
+        'link': (article.get('link') or '').strip(),
+        'doi': (article.get('result_id') or '').strip() or None,  # Changed from 'doi' to 'result_id'
+        'submitter': author_names[0] if author_names and author_names[0] else 'Unknown',
+        'authors': [name for name in author_names if name],
+        'categories': (categories_str or '').split(),  # Assuming categories are space-separated
+    }
+
+def flush_enrichment(cursor, results, current_date):
+    """Upsert buffered Scholar results with one multi-row statement per table."""
+    if not results:
+        return
+    # One row per title fingerprint: a statement cannot upsert the same row twice
+    by_fingerprint = {}
+    authors_by_fingerprint = {}
+    categories_by_fingerprint = {}
+    # Rows are written in key order so concurrent workers lock them in the same order and cannot deadlock
+    for result in results:
+        fingerprint = title_fingerprint(result['title'])
+        by_fingerprint[fingerprint] = result
+        authors_by_fingerprint.setdefault(fingerprint, set()).update(result['authors'])
+        categories_by_fingerprint.setdefault(fingerprint, set()).update(result['categories'])
+
+    # Scholar results matching an existing row by fingerprint land on it instead of adding a
+    # duplicate, and only fill in what it lacks: Scholar's result id and link are no real DOI
+    # or journal reference, and arXiv rows keep the update date of the snapshot
+    returned = psycopg2.extras.execute_values(cursor, """
+        INSERT INTO publications (submitter, title, title_fingerprint, journal_ref, doi, update_date)
+        VALUES %s
+        ON CONFLICT (title_fingerprint) DO UPDATE
+        SET journal_ref = COALESCE(publications.journal_ref, EXCLUDED.journal_ref),
+            doi = COALESCE(publications.doi, EXCLUDED.doi),
+            update_date = CASE WHEN publications.arxiv_id IS NULL THEN EXCLUDED.update_date ELSE publications.update_date END
+        RETURNING id, title_fingerprint::text;
+    """, [(r['submitter'], r['title'], fingerprint, r['link'], r['doi'], current_date) for fingerprint, r in sorted(by_fingerprint.items())],
+        template="(%s, %s, %s::uuid, %s, %s, %s)", page_size=len(by_fingerprint), fetch=True)
+    publication_ids = {fingerprint: publication_id for publication_id, fingerprint in returned}
+    metrics.incr('publications_upserted', len(publication_ids))
+
+    author_ids = resolve_author_ids(cursor, {name for names in authors_by_fingerprint.values() for name in names})
+    authorship_rows = sorted({(publication_ids[fingerprint], author_ids[name])
+                              for fingerprint, names in authors_by_fingerprint.items() for name in names})
+    if authorship_rows:
+        psycopg2.extras.execute_values(cursor, """
+            INSERT INTO authorship (publication_id, author_id) VALUES %s
+            ON CONFLICT DO NOTHING;
+        """, authorship_rows, page_size=len(authorship_rows))
+        metrics.incr('authorship_rows_written', cursor.rowcount)
+
+    category_ids = resolve_category_ids(cursor, {name for names in categories_by_fingerprint.values() for name in names})
+    category_rows = sorted({(publication_ids[fingerprint], category_ids[name])
+                            for fingerprint, names in categories_by_fingerprint.items() for name in names})
+    if category_rows:
+        psycopg2.extras.execute_values(cursor, """
+            INSERT INTO publication_category (publication_id, category_id) VALUES %s
+            ON CONFLICT DO NOTHING;
+        """, category_rows, page_size=len(category_rows))
+        metrics.incr('publication_category_rows_written', cursor.rowcount)
+
+@work_queue_stage('enrichment')
+def process_enrichment_items(cursor, items):
+    """Search Scholar for the claimed papers and upsert what it found."""
+    current_date = datetime.now().date()
+    all_results = query_google_scholar_many(title for _, title, _, _ in items)
+    buffered = []
+    for (publication_id, title, categories_str, _), search_results in zip(items, all_results):
+        if not search_results or 'organic_results' not in search_results:
+            # The response is cached, so a retry would get the same answer: the item is done
+            logging.warning(f"No results or invalid response for title '{title}'")
+            continue
+
+        for article in search_results['organic_results']:
+            result = parse_scholar_article(article, categories_str)
+            if result['title']:
+                buffered.append(result)
+    # Chunks are taken in fingerprint order to keep the row locks of concurrent workers ordered
+    buffered.sort(key=lambda result: title_fingerprint(result['title']))
+    for chunk in iter_batches(buffered, enrichment_batch_size):
+        with metrics.timer('flush_enrichment_seconds'):
+            flush_enrichment(cursor, chunk, current_date)
+    return {}
+
+@instrumented_task
+def enrich_publications(cycle=2, warm_cache=False, workers=work_queue_workers, **context):
+    """Enrich the next papers of every category with Google Scholar results.
+
+    Each cycle queues the next papers of every category and drains the
+    queue. Items left pending by an interrupted run are finished first.
+    """
     try:
-        with psycopg2.connect(**db_params) as conn:
+        with db_connection() as conn:
             with conn.cursor() as cursor:
-                for cycle_number in range(cycle):
-                    logging.info(f"Starting enrichment cycle {cycle_number + 1}")
-
-                    selected_papers = select_papers_from_categories(cursor)
-                    for publication_id, title, categories_str in selected_papers:
-                        search_results = query_google_scholar(title)
-                        if not search_results or 'organic_results' not in search_results:
-                            logging.warning(f"No results or invalid response for title '{title}'")
-                            continue
-
-                        for article in search_results['organic_results']:
-                            new_title = article.get('title', '').strip()
-                            new_link = article.get('link', '').strip()
-                            new_doi = article.get('result_id', '').strip()  # Changed from 'doi' to 'result_id'
-                            current_date = datetime.now().date()
-                            first_author = article.get('publication_info', {}).get('authors', [{}])[0].get('name', 'Unknown')
-                        
-                            # Insert or update publication data
-                            cursor.execute("""
-                                INSERT INTO publications (submitter, title, journal_ref, doi, update_date)
-                                VALUES (%s, %s, %s, %s, %s)
-                                ON CONFLICT (title) DO UPDATE
-                                SET journal_ref = EXCLUDED.journal_ref,
-                                    doi = COALESCE(EXCLUDED.doi, publications.doi),
-                                    update_date = EXCLUDED.update_date
-                                RETURNING id;
-                            """, (first_author, new_title, new_link, new_doi or None, current_date))
-
-                            new_publication_id = cursor.fetchone()[0]
-
-                            # Handle authors
-                            author_list = article.get('publication_info', {}).get('authors', [])
-                            for author_info in author_list:
-                                author_name = author_info.get('name').strip()
-                                if author_name:
-                                    author_id = get_or_insert_author_id(cursor, author_name)
-                                    cursor.execute("""
-                                        INSERT INTO authorship (publication_id, author_id)
-                                        VALUES (%s, %s)
-                                        ON CONFLICT DO NOTHING;
-                                    """, (new_publication_id, author_id))
-                            
-                            # Handle categories
-                            categories = categories_str.split()  # Assuming categories are space-separated
-                            for category_name in categories:
-                                category_id = get_or_insert_category_id(cursor, category_name)
-                                cursor.execute("""
-                                    INSERT INTO publication_category (publication_id, category_id)
-                                    VALUES (%s, %s)
-                                    ON CONFLICT DO NOTHING;
-                                """, (new_publication_id, category_id))
-
-                    conn.commit()
-                    logging.info(f"Enrichment cycle {cycle_number + 1} completed successfully.")
+                if warm_cache:
+                    warm_id_caches(cursor)  # Inherited by the forked queue workers
+                full_refresh = is_full_refresh(context)
+                # Per-category position of the last queued paper, carried over between runs
+                last_ids = get_watermark(cursor, 'enrich_publications', full_refresh) or {}
+
+        enriched, failed = run_work_queue('enrichment', workers)
+        for cycle_number in range(cycle):
+            logging.info(f"Starting enrichment cycle {cycle_number + 1}")
+            with db_connection() as conn:
+                with conn.cursor() as cursor:
+                    selected_papers = select_papers_from_categories(cursor, last_ids=last_ids)
+                    metrics.incr('papers_selected', len(selected_papers))
+                    enqueue_work(cursor, 'enrichment', [publication_id for publication_id, _, _ in selected_papers], requeue=full_refresh)
+                    set_watermark(cursor, 'enrich_publications', last_ids)
+
+            cycle_enriched, cycle_failed = run_work_queue('enrichment', workers)
+            enriched += cycle_enriched
+            failed += cycle_failed
+            logging.info(f"Enrichment cycle {cycle_number + 1} completed: {cycle_enriched} papers enriched, {cycle_failed} failed.")
+
+        log_id_cache_stats()
+        get_scholar_cache().log_stats()
+        return {'enriched': enriched, 'failed': failed}
 
     except psycopg2.Error as e:
+        rollback_id_caches()
         logging.error(f"Database connection error during publication enrichment: {e}")
         raise
 
@@ -268,63 +2262,175 @@ def enrich_publications(cycle=2):
 ### DATA TRANSFORMATION TASK
 
 
+# BibTeX entry type -> publication type
+bibtex_entry_types = {
+    'article': 'Journal Article',
+    'inproceedings': 'Conference Paper',
+    'conference': 'Conference Paper',
+    'proceedings': 'Conference Proceedings',
+    'book': 'Book',
+    'inbook': 'Book Chapter',
+    'incollection': 'Collection',
+    'thesis': 'Thesis',
+    'phdthesis': 'PhD Thesis',
+    'mastersthesis': 'Masters Thesis',
+    'techreport': 'Technical Report',
+    'manual': 'Manual',
+    'unpublished': 'Unpublished Work',
+    'misc': 'Miscellaneous',
+    'patent': 'Patent',
+    'online': 'Online Resource',
+}
+
+bibtex_entry_type = re.compile(r'@(\w+)\s*\{')
+
 def extract_publication_type(search_results):
     for result in search_results.get('results', []):
-        bib_entry = result.get('bib_entry', '')
-        if '@article' in bib_entry:
-            return 'Journal Article'
-        elif '@inproceedings' in bib_entry:
-            return 'Conference Paper'
-        elif '@book' in bib_entry:
-            return 'Book'
-        elif '@thesis' in bib_entry:
-            return 'Thesis'
-        elif '@techreport' in bib_entry:
-            return 'Technical Report'
-        elif '@manual' in bib_entry:
-            return 'Manual'
-        elif '@proceedings' in bib_entry:
-            return 'Conference Proceedings'
-        elif '@unpublished' in bib_entry:
-            return 'Unpublished Work'
-        elif '@misc' in bib_entry:
-            return 'Miscellaneous'
-        elif '@phdthesis' in bib_entry:
-            return 'PhD Thesis'
-        elif '@mastersthesis' in bib_entry:
-            return 'Masters Thesis'
-        elif '@inbook' in bib_entry:
-            return 'Book Chapter'
-        elif '@incollection' in bib_entry:
-            return 'Collection'
-        elif '@patent' in bib_entry:
-            return 'Patent'
-        elif '@online' in bib_entry:
-            return 'Online Resource'
+        match = bibtex_entry_type.search(result.get('bib_entry') or '')
+        publication_type = bibtex_entry_types.get(match.group(1).lower()) if match else None
+        if publication_type:
+            return publication_type
     return 'Unknown'
 
+# Patterns over the arXiv comments field, tried in order after the journal-ref
+thesis_comment_patterns = (
+    (re.compile(r"\bph\.?\s?d\.?\s+(thesis|dissertation)|\bdoctoral\s+(thesis|dissertation)", re.IGNORECASE), 'PhD Thesis'),
+    (re.compile(r"\bmaster'?s?\s+thesis|\bm\.?sc\.?\s+thesis", re.IGNORECASE), 'Masters Thesis'),
+    (re.compile(r"\b(thesis|dissertation|habilitation)\b", re.IGNORECASE), 'Thesis'),
+)
+
+# Comments of papers drawn from a thesis rather than the thesis itself
+thesis_derived_comment = re.compile(r"\b(based on|part of|parts of|chapter of|chapters of|from|adapted from|extracted from)\s+"
+                                    r"(\S+\s+){0,5}?(thesis|dissertation|habilitation)\b", re.IGNORECASE)
+
+venue_comment_patterns = (
+    (re.compile(r"\bbook\s+chapter\b|\bchapter\s+(in|of|for)\b", re.IGNORECASE), 'Book Chapter'),
+    (re.compile(r"\b(proceedings|conference|workshop|symposium)\b"
+                r"|\b(NeurIPS|NIPS|ICML|ICLR|CVPR|ICCV|ECCV|AAAI|IJCAI|ACL|EMNLP|NAACL|KDD|SIGMOD|VLDB|STOC|FOCS|SODA|ICALP)\b",
+                re.IGNORECASE), 'Conference Paper'),
+)
+
+# Journals whose names look like conference proceedings
+proceedings_journals = re.compile(r"Proc\.?\s+Natl\.?\s+Acad|PNAS|Proc\.?\s+(R\.|Roy\.|Royal)\s+Soc|Proc\.?\s+Amer\.?\s+Math|"
+                                  r"Proceedings of the (National Academy|Royal Society|American Mathematical)", re.IGNORECASE)
+proceedings_venue = re.compile(r"\b(Proc\.|Proceedings|Conference|Conf\.|Workshop|Symposium|Symp\.)", re.IGNORECASE)
+
+# DOI prefixes that identify the kind of venue on their own; publisher-wide prefixes
+# covering both journals and proceedings (Springer books, ACM) are left to Scholar
+doi_prefix_types = (
+    ('10.1017/cbo', 'Book Chapter'),
+    ('10.4230/lipics', 'Conference Paper'),
+    ('10.1109/cvpr', 'Conference Paper'),
+    ('10.1103/', 'Journal Article'),
+    ('10.1088/', 'Journal Article'),
+    ('10.1016/j.', 'Journal Article'),
+    ('10.1051/', 'Journal Article'),
+    ('10.1093/mnras', 'Journal Article'),
+    ('10.3847/', 'Journal Article'),
+)
+
+def infer_publication_type(journal_ref, comments, doi):
+    """Infer a publication type from the arXiv metadata alone, or None if it cannot tell."""
+    comments = comments or ''
+    if journal_ref:
+        if proceedings_venue.search(journal_ref) and not proceedings_journals.search(journal_ref):
+            return 'Conference Paper'
+        return 'Journal Article'
+    if not thesis_derived_comment.search(comments):
+        for pattern, publication_type in thesis_comment_patterns:
+            if pattern.search(comments):
+                return publication_type
+    for pattern, publication_type in venue_comment_patterns:
+        if pattern.search(comments):
+            return publication_type
+    doi = (doi or '').lower()
+    for prefix, publication_type in doi_prefix_types:
+        if doi.startswith(prefix):
+            return publication_type
+    return None
 
-def resolve_publication_types():
+def store_publication_types(cursor, rows):
+    """Write buffered (publication_id, publication_type) pairs with one multi-row statement."""
+    if rows:
+        psycopg2.extras.execute_values(cursor, """
+            UPDATE publications p
+            SET publication_type = v.publication_type
+            FROM (VALUES %s) AS v (id, publication_type)
+            WHERE p.id = v.id;
+        """, rows, page_size=len(rows))
+        metrics.incr('publication_types_written', len(rows))
+
+@work_queue_stage('publication_types')
+def process_publication_type_items(cursor, items):
+    """Look up the claimed titles on Scholar and store their publication type."""
+    pause_audit(cursor)
+    all_results = query_google_scholar_many(title for _, title, _, _ in items)
+    rows = []
+    for (publication_id, title, _, _), search_results in zip(items, all_results):
+        if not search_results or 'results' not in search_results:
+            # The response is cached, so a retry would get the same answer: typed Unknown,
+            # looked up again on a full refresh
+            logging.warning(f"No results or invalid response for title '{title}'")
+            metrics.incr('publication_types_unknown')
+            rows.append((publication_id, 'Unknown'))
+            continue
+        publication_type = extract_publication_type(search_results)
+        metrics.incr('publication_types_resolved' if publication_type != 'Unknown' else 'publication_types_unknown')
+        if publication_type == 'Unknown':
+            logging.warning(f"Unknown publication type for title '{title}' (ID: {publication_id})")
+        rows.append((publication_id, publication_type))
+    store_publication_types(cursor, rows)
+    return {}
+
+@instrumented_task
+def resolve_publication_types(workers=work_queue_workers, **context):
+    """Type the publications that have no publication_type yet.
+
+    Types are inferred offline from journal-ref, comments and DOI where
+    possible; only the remaining titles are queued for a Scholar lookup.
+    The stored type is the cache: typed publications are never looked at
+    again, and 'Unknown' ones are retried on a full refresh.
+    """
     try:
-        with psycopg2.connect(**db_params) as conn:
+        full_refresh = is_full_refresh(context)
+        untyped = stream_rows("""
+            SELECT id, title, journal_ref, comments, doi
+            FROM publications
+            WHERE publication_type IS NULL OR (%s AND publication_type = 'Unknown')
+            ORDER BY id;
+        """, (full_refresh,))
+        with untyped as publications, db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT id, title FROM publications;")
-                publications = cursor.fetchall()
-
-                for publication_id, title in publications:
-                    try:
-                        publication_type = update_publication_type(cursor, publication_id, title)
-                        if publication_type == 'Unknown':
-                            logging.warning(f"Unknown publication type for title '{title}' (ID: {publication_id})")
-                    except Exception as e:
-                        logging.error(f"Error in resolve_publication_types for publication ID {publication_id}: {e}")
-                        continue  # Skip to the next publication in case of an error
-
-                conn.commit()
-                logging.info("Publication types resolved successfully.")
+                inferred = 0
+                for chunk in iter_batches(publications, enrichment_batch_size):
+                    metrics.incr('publications_read', len(chunk))
+                    pause_audit(cursor)
+                    rows = []
+                    lookups = []
+                    for publication_id, title, journal_ref, comments, doi in chunk:
+                        publication_type = infer_publication_type(journal_ref, comments, doi)
+                        if publication_type:
+                            rows.append((publication_id, publication_type))
+                        else:
+                            lookups.append(publication_id)
+                    store_publication_types(cursor, rows)
+                    enqueue_work(cursor, 'publication_types', lookups, requeue=full_refresh)
+                    conn.commit()
+                    inferred += len(rows)
+                metrics.incr('publication_types_inferred', inferred)
+
+        looked_up, failed = run_work_queue('publication_types', workers)
+        if inferred or looked_up:
+            with db_connection() as conn:
+                with conn.cursor() as cursor:
+                    log_bulk_operation(cursor, 'BULK SET TYPE', {'inferred': inferred, 'looked_up': looked_up})
+        get_scholar_cache().log_stats()
+        logging.info(f"Publication types resolved successfully: {inferred} inferred, {looked_up} looked up, {failed} failed.")
+        return {'inferred': inferred, 'looked_up': looked_up, 'failed': failed}
 
     except psycopg2.Error as e:
         logging.error(f"Database connection error during resolving publication types: {e}")
+        raise
 
 
 
@@ -336,148 +2442,733 @@ def extract_resolved_author_name(search_results):
     return 'Unknown'
 
 
-def update_author_name(cursor, author_id, name):
-    search_results = query_google_scholar('author:' + name)
-    resolved_name = extract_resolved_author_name(search_results)
+# Authors keyed per statement, and blocking keys clustered per query
+author_resolution_batch_size = 10000
 
-    update_query = """
-        UPDATE authors 
-        SET name = %s 
-        WHERE id = %s;
-    """
-    cursor.execute(update_query, (resolved_name, author_id))
+# Minimum similarity of two name variants in a block for them to be merged
+author_merge_threshold = 0.8
 
+# Ambiguous variants matching more clusters than this are left alone rather than looked up
+author_max_candidates = 5
 
+# Generational suffixes ignored when picking the surname
+name_suffixes = {'jr', 'sr', 'ii', 'iii', 'iv'}
 
-def update_publication_type(cursor, publication_id, title):
-    try:
-        search_results = query_google_scholar(title)
-        if not search_results or 'results' not in search_results:
-            logging.warning(f"No results or invalid response for title '{title}'")
-            return 'Unknown'  # Default value in case of no results
+def author_name_tokens(name):
+    """Split a name into accent-free, case-folded tokens, dropping punctuation and suffixes."""
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(char for char in name if not unicodedata.combining(char)).casefold()
+    return [token for token in re.split(r"[\s.,]+", name) if token and token not in name_suffixes]
 
-        publication_type = extract_publication_type(search_results)
+def author_keys(name):
+    """Return (normalized_name, blocking_key) of a 'First Middle Last' name.
 
-        update_query = """
-            UPDATE publications 
-            SET publication_type = %s 
-            WHERE id = %s;
-        """
-        cursor.execute(update_query, (publication_type, publication_id))
+    The normalized name is the case-folded, accent-free given names and
+    surname; the blocking key is the surname plus the first initial, so that
+    'L. Theran' and 'Louis Theran' land in the same block.
+    """
+    tokens = author_name_tokens(name)
+    if not tokens:
+        return '', ''
+    surname = tokens[-1]
+    given = [token.replace('-', '') for token in tokens[:-1] if token.replace('-', '')]
+    normalized_name = ' '.join(given + [surname])
+    return normalized_name, f"{surname} {given[0][0]}" if given else surname
+
+def name_similarity(given_a, given_b):
+    """Score how likely two given-name token lists of the same block belong to one person.
+
+    Equal tokens match, an initial matches any name it abbreviates, and two
+    different full names conflict (score 0). Initials and missing middle
+    names lower the score.
+    """
+    if given_a == given_b:
+        return 1.0
+    score = 1.0
+    for a, b in zip(given_a, given_b):
+        if a == b:
+            continue
+        if (len(a) == 1 or len(b) == 1) and a[0] == b[0]:
+            score *= 0.9
+            continue
+        return 0.0
+    return score * 0.95 ** abs(len(given_a) - len(given_b))
+
+def cluster_author_block(members):
+    """Cluster the name variants sharing one blocking key.
+
+    members are (author_id, name, normalized_name) rows. Variants are placed
+    from the most to the least complete and each joins the one cluster whose
+    names it is compatible with. A variant compatible with several clusters
+    ('l theran' next to 'louis theran' and 'lucas theran') is ambiguous and
+    is returned for an external lookup instead.
+
+    Returns (merges, ambiguous): merges are (duplicate_id, canonical_id)
+    pairs; ambiguous entries are (author_id, name, candidates), candidates
+    mapping each matching cluster's normalized name to its canonical id.
+    """
+    variants = {}
+    for author_id, name, normalized_name in members:
+        variants.setdefault(normalized_name, []).append((author_id, name))
+
+    def completeness(normalized_name):
+        given = normalized_name.split()[:-1]
+        return (-sum(len(token) > 1 for token in given), -len(given), -len(normalized_name),
+                min(variants[normalized_name])[0])
+
+    clusters = []
+    merges = []
+    ambiguous = []
+    for normalized_name in sorted(variants, key=completeness):
+        given = normalized_name.split()[:-1]
+        rows = sorted(variants[normalized_name])
+        # Spellings that normalize identically ('José' and 'Jose') are always the same author
+        variant_id = rows[0][0]
+        merges.extend((author_id, variant_id) for author_id, _ in rows[1:])
+
+        matches = []
+        for cluster in clusters:
+            if all(name_similarity(given, other) >= author_merge_threshold for other in cluster['given']):
+                matches.append(cluster)
+                if len(matches) > author_max_candidates:
+                    break
+        if not matches:
+            clusters.append({'name': normalized_name, 'given': [given], 'canonical_id': variant_id})
+        elif len(matches) == 1:
+            matches[0]['given'].append(given)
+            merges.append((variant_id, matches[0]['canonical_id']))
+        elif len(matches) <= author_max_candidates:
+            ambiguous.append((variant_id, rows[0][1], {cluster['name']: cluster['canonical_id'] for cluster in matches}))
+        else:
+            metrics.incr('author_variants_too_ambiguous')
+    return merges, ambiguous
 
-    except Exception as e:
-        logging.error(f"Error updating publication type for publication ID {publication_id}: {e}")
-        raise  # Raising exception to stop the script on failure
+def update_author_keys(cursor, last_id):
+    """Fill normalized_name and blocking_key for authors added after last_id.
+
+    Returns the blocking keys touched and the highest author id seen.
+    """
+    blocking_keys = set()
+    newest_id = last_id
+    with stream_rows("SELECT id, name FROM authors WHERE id > %s ORDER BY id;", (last_id,)) as authors:
+        for chunk in iter_batches(authors, author_resolution_batch_size):
+            metrics.incr('authors_read', len(chunk))
+            rows = [(author_id,) + author_keys(name) for author_id, name in chunk]
+            psycopg2.extras.execute_values(cursor, """
+                UPDATE authors a
+                SET normalized_name = v.normalized_name, blocking_key = v.blocking_key
+                FROM (VALUES %s) AS v (id, normalized_name, blocking_key)
+                WHERE a.id = v.id;
+            """, rows, page_size=len(rows))
+            blocking_keys.update(blocking_key for _, _, blocking_key in rows if blocking_key)
+            newest_id = chunk[-1][0]
+    return blocking_keys, newest_id
+
+def resolve_ambiguous_authors(ambiguous):
+    """Ask Scholar which cluster each ambiguous variant belongs to; returns the merges settled."""
+    merges = []
+    for chunk in iter_batches(ambiguous, serpapi_fanout_size):
+        all_results = query_google_scholar_many('author:' + name for _, name, _ in chunk)
+        for (author_id, name, candidates), search_results in zip(chunk, all_results):
+            resolved_name = extract_resolved_author_name(search_results) if search_results else 'Unknown'
+            canonical_id = candidates.get(author_keys(resolved_name)[0])
+            if canonical_id is None:
+                metrics.incr('author_names_unresolved')
+                logging.warning(f"Unable to resolve author name for '{name}' (ID: {author_id})")
+                continue
+            metrics.incr('author_names_resolved')
+            merges.append((author_id, canonical_id))
+    return merges
+
+def merge_authors(cursor, merges):
+    """Point duplicate authors at their canonical author and move their authorship in bulk.
+
+    Duplicates keep their row, so the loaders keep mapping that spelling to
+    the canonical id instead of inserting it again. Returns the number merged.
+    """
+    targets = dict(merges)
+    if not targets:
+        return 0
+
+    def canonical(author_id):
+        while author_id in targets:
+            author_id = targets[author_id]
+        return author_id
+
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS author_merges (duplicate_id INT PRIMARY KEY, canonical_id INT NOT NULL);
+        TRUNCATE author_merges;
+    """)
+    copy_rows(cursor, 'author_merges', ('duplicate_id', 'canonical_id'),
+              [(duplicate_id, canonical(canonical_id)) for duplicate_id, canonical_id in targets.items()])
+    cursor.execute("""
+        INSERT INTO authorship (publication_id, author_id)
+        SELECT ap.publication_id, m.canonical_id
+        FROM authorship ap
+        JOIN author_merges m ON m.duplicate_id = ap.author_id
+        ORDER BY 1, 2
+        ON CONFLICT DO NOTHING;
+
+        DELETE FROM authorship ap
+        USING author_merges m
+        WHERE ap.author_id = m.duplicate_id;
+
+        -- Earlier duplicates of a merged author follow it to the new canonical author.
+        -- Two statements rather than an OR, so each is a plain join on one indexed key
+        UPDATE authors a
+        SET canonical_id = m.canonical_id
+        FROM author_merges m
+        WHERE a.canonical_id = m.duplicate_id;
+
+        UPDATE authors a
+        SET canonical_id = m.canonical_id
+        FROM author_merges m
+        WHERE a.id = m.duplicate_id;
+    """)
+    return len(targets)
 
+@instrumented_task
+def resolve_author_names(**context):
+    """Merge author name variants such as 'L. Theran' and 'Louis Theran'.
 
-def resolve_author_names():
+    New authors get a normalized name and blocking key; every block they
+    touch is clustered locally, and only variants that match several
+    clusters are looked up on Scholar before the merges are applied.
+    """
     try:
-        with psycopg2.connect(**db_params) as conn:
+        with db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT id, name FROM authors;")
-                authors = cursor.fetchall()
-
-                for author_id, name in authors:
-                    try:
-                        resolved_name = update_author_name(cursor, author_id, name)
-                        if resolved_name == 'Unknown':
-                            logging.warning(f"Unable to resolve author name for '{name}' (ID: {author_id})")
-                    except Exception as e:
-                        logging.error(f"Error updating author name for author ID {author_id}: {e}")
-                        continue  # Skip to the next author in case of an error
-
+                last_id = get_watermark(cursor, 'resolve_author_names', is_full_refresh(context)) or 0
+                blocking_keys, newest_id = update_author_keys(cursor, last_id)
+                conn.commit()  # The block reads below run on their own connection
+
+                merges = []
+                ambiguous = []
+                for chunk in iter_batches(sorted(blocking_keys), author_resolution_batch_size):
+                    block_rows = stream_rows("""
+                        SELECT id, name, normalized_name, blocking_key
+                        FROM authors
+                        WHERE canonical_id IS NULL AND blocking_key = ANY(%s)
+                        ORDER BY blocking_key, id;
+                    """, (chunk,))
+                    with block_rows as authors:
+                        for _, members in itertools.groupby(authors, key=lambda row: row[3]):
+                            block_merges, block_ambiguous = cluster_author_block([row[:3] for row in members])
+                            merges.extend(block_merges)
+                            ambiguous.extend(block_ambiguous)
+                            metrics.incr('author_blocks')
+                metrics.incr('author_variants_ambiguous', len(ambiguous))
+
+                merges.extend(resolve_ambiguous_authors(ambiguous))
+                merged = merge_authors(cursor, merges)
+                metrics.incr('authors_merged', merged)
+
+                set_watermark(cursor, 'resolve_author_names', newest_id)
                 conn.commit()
-                logging.info("Author names resolved successfully.")
+                author_id_cache.clear()  # Cached ids may now belong to merged duplicates
+                get_scholar_cache().log_stats()
+                logging.info(f"Author names resolved successfully: {merged} duplicates merged, "
+                             f"{len(ambiguous)} ambiguous variants looked up.")
     except psycopg2.Error as e:
         logging.error(f"Database connection error during author name resolution: {e}")
 
 
 
 
-def map_to_normalized_category(category_name):
-    category_mapping = {
-        'hep-ph': 'High Energy Physics - Phenomenology',
-        'quant-ph': 'Quantum Physics',
-        'cs.AI': 'Computer Science - Artificial Intelligence',
-        'cs.DB': 'Computer Science - Databases',
-        'math.AP': 'Mathematics - Analysis of PDEs',
-        'bio.GN': 'Biology - Genomics',
-        'chem.OC': 'Chemistry - Organic Chemistry',
-        'econ.TH': 'Economics - Theory',
-        'eng.EL': 'Engineering - Electrical',
-        'env.SCI': 'Environmental Science',
-        'geo.MET': 'Geoscience - Meteorology',
-        'hist': 'History',
-        'ling': 'Linguistics',
-        'med.ON': 'Medicine - Oncology',
-        'phil': 'Philosophy',
-        'phy.AP': 'Physics - Astrophysics',
-        'pol': 'Political Science',
-        'psy.CL': 'Psychology - Clinical',
-        'soc.SOC': 'Sociology',
-        'vet': 'Veterinary Medicine',
-        'edu': 'Education',
-    }
-    return category_mapping.get(category_name, 'Other')
+# arXiv archive -> (archive name, group)
+arxiv_archives = {
+    'astro-ph': ('Astrophysics', 'Physics'),
+    'cond-mat': ('Condensed Matter', 'Physics'),
+    'gr-qc': ('General Relativity and Quantum Cosmology', 'Physics'),
+    'hep-ex': ('High Energy Physics - Experiment', 'Physics'),
+    'hep-lat': ('High Energy Physics - Lattice', 'Physics'),
+    'hep-ph': ('High Energy Physics - Phenomenology', 'Physics'),
+    'hep-th': ('High Energy Physics - Theory', 'Physics'),
+    'math-ph': ('Mathematical Physics', 'Physics'),
+    'nlin': ('Nonlinear Sciences', 'Physics'),
+    'nucl-ex': ('Nuclear Experiment', 'Physics'),
+    'nucl-th': ('Nuclear Theory', 'Physics'),
+    'physics': ('Physics', 'Physics'),
+    'quant-ph': ('Quantum Physics', 'Physics'),
+    'math': ('Mathematics', 'Mathematics'),
+    'cs': ('Computer Science', 'Computer Science'),
+    'q-bio': ('Quantitative Biology', 'Quantitative Biology'),
+    'q-fin': ('Quantitative Finance', 'Quantitative Finance'),
+    'stat': ('Statistics', 'Statistics'),
+    'eess': ('Electrical Engineering and Systems Science', 'Electrical Engineering and Systems Science'),
+    'econ': ('Economics', 'Economics'),
+}
+
+# arXiv category code -> name; the archive is the part of the code before the dot
+arxiv_categories = {
+    'astro-ph': 'Astrophysics',
+    'astro-ph.CO': 'Cosmology and Nongalactic Astrophysics',
+    'astro-ph.EP': 'Earth and Planetary Astrophysics',
+    'astro-ph.GA': 'Astrophysics of Galaxies',
+    'astro-ph.HE': 'High Energy Astrophysical Phenomena',
+    'astro-ph.IM': 'Instrumentation and Methods for Astrophysics',
+    'astro-ph.SR': 'Solar and Stellar Astrophysics',
+    'cond-mat': 'Condensed Matter',
+    'cond-mat.dis-nn': 'Disordered Systems and Neural Networks',
+    'cond-mat.mes-hall': 'Mesoscale and Nanoscale Physics',
+    'cond-mat.mtrl-sci': 'Materials Science',
+    'cond-mat.other': 'Other Condensed Matter',
+    'cond-mat.quant-gas': 'Quantum Gases',
+    'cond-mat.soft': 'Soft Condensed Matter',
+    'cond-mat.stat-mech': 'Statistical Mechanics',
+    'cond-mat.str-el': 'Strongly Correlated Electrons',
+    'cond-mat.supr-con': 'Superconductivity',
+    'gr-qc': 'General Relativity and Quantum Cosmology',
+    'hep-ex': 'High Energy Physics - Experiment',
+    'hep-lat': 'High Energy Physics - Lattice',
+    'hep-ph': 'High Energy Physics - Phenomenology',
+    'hep-th': 'High Energy Physics - Theory',
+    'math-ph': 'Mathematical Physics',
+    'nlin.AO': 'Adaptation and Self-Organizing Systems',
+    'nlin.CD': 'Chaotic Dynamics',
+    'nlin.CG': 'Cellular Automata and Lattice Gases',
+    'nlin.PS': 'Pattern Formation and Solitons',
+    'nlin.SI': 'Exactly Solvable and Integrable Systems',
+    'nucl-ex': 'Nuclear Experiment',
+    'nucl-th': 'Nuclear Theory',
+    'physics.acc-ph': 'Accelerator Physics',
+    'physics.ao-ph': 'Atmospheric and Oceanic Physics',
+    'physics.app-ph': 'Applied Physics',
+    'physics.atm-clus': 'Atomic and Molecular Clusters',
+    'physics.atom-ph': 'Atomic Physics',
+    'physics.bio-ph': 'Biological Physics',
+    'physics.chem-ph': 'Chemical Physics',
+    'physics.class-ph': 'Classical Physics',
+    'physics.comp-ph': 'Computational Physics',
+    'physics.data-an': 'Data Analysis, Statistics and Probability',
+    'physics.ed-ph': 'Physics Education',
+    'physics.flu-dyn': 'Fluid Dynamics',
+    'physics.gen-ph': 'General Physics',
+    'physics.geo-ph': 'Geophysics',
+    'physics.hist-ph': 'History and Philosophy of Physics',
+    'physics.ins-det': 'Instrumentation and Detectors',
+    'physics.med-ph': 'Medical Physics',
+    'physics.optics': 'Optics',
+    'physics.plasm-ph': 'Plasma Physics',
+    'physics.pop-ph': 'Popular Physics',
+    'physics.soc-ph': 'Physics and Society',
+    'physics.space-ph': 'Space Physics',
+    'quant-ph': 'Quantum Physics',
+    'math.AC': 'Commutative Algebra',
+    'math.AG': 'Algebraic Geometry',
+    'math.AP': 'Analysis of PDEs',
+    'math.AT': 'Algebraic Topology',
+    'math.CA': 'Classical Analysis and ODEs',
+    'math.CO': 'Combinatorics',
+    'math.CT': 'Category Theory',
+    'math.CV': 'Complex Variables',
+    'math.DG': 'Differential Geometry',
+    'math.DS': 'Dynamical Systems',
+    'math.FA': 'Functional Analysis',
+    'math.GM': 'General Mathematics',
+    'math.GN': 'General Topology',
+    'math.GR': 'Group Theory',
+    'math.GT': 'Geometric Topology',
+    'math.HO': 'History and Overview',
+    'math.KT': 'K-Theory and Homology',
+    'math.LO': 'Logic',
+    'math.MG': 'Metric Geometry',
+    'math.NA': 'Numerical Analysis',
+    'math.NT': 'Number Theory',
+    'math.OA': 'Operator Algebras',
+    'math.OC': 'Optimization and Control',
+    'math.PR': 'Probability',
+    'math.QA': 'Quantum Algebra',
+    'math.RA': 'Rings and Algebras',
+    'math.RT': 'Representation Theory',
+    'math.SG': 'Symplectic Geometry',
+    'math.SP': 'Spectral Theory',
+    'math.ST': 'Statistics Theory',
+    'cs.AI': 'Artificial Intelligence',
+    'cs.AR': 'Hardware Architecture',
+    'cs.CC': 'Computational Complexity',
+    'cs.CE': 'Computational Engineering, Finance, and Science',
+    'cs.CG': 'Computational Geometry',
+    'cs.CL': 'Computation and Language',
+    'cs.CR': 'Cryptography and Security',
+    'cs.CV': 'Computer Vision and Pattern Recognition',
+    'cs.CY': 'Computers and Society',
+    'cs.DB': 'Databases',
+    'cs.DC': 'Distributed, Parallel, and Cluster Computing',
+    'cs.DL': 'Digital Libraries',
+    'cs.DM': 'Discrete Mathematics',
+    'cs.DS': 'Data Structures and Algorithms',
+    'cs.ET': 'Emerging Technologies',
+    'cs.FL': 'Formal Languages and Automata Theory',
+    'cs.GL': 'General Literature',
+    'cs.GR': 'Graphics',
+    'cs.GT': 'Computer Science and Game Theory',
+    'cs.HC': 'Human-Computer Interaction',
+    'cs.IR': 'Information Retrieval',
+    'cs.IT': 'Information Theory',
+    'cs.LG': 'Machine Learning',
+    'cs.LO': 'Logic in Computer Science',
+    'cs.MA': 'Multiagent Systems',
+    'cs.MM': 'Multimedia',
+    'cs.MS': 'Mathematical Software',
+    'cs.NE': 'Neural and Evolutionary Computing',
+    'cs.NI': 'Networking and Internet Architecture',
+    'cs.OH': 'Other Computer Science',
+    'cs.OS': 'Operating Systems',
+    'cs.PF': 'Performance',
+    'cs.PL': 'Programming Languages',
+    'cs.RO': 'Robotics',
+    'cs.SC': 'Symbolic Computation',
+    'cs.SD': 'Sound',
+    'cs.SE': 'Software Engineering',
+    'cs.SI': 'Social and Information Networks',
+    'q-bio.BM': 'Biomolecules',
+    'q-bio.CB': 'Cell Behavior',
+    'q-bio.GN': 'Genomics',
+    'q-bio.MN': 'Molecular Networks',
+    'q-bio.NC': 'Neurons and Cognition',
+    'q-bio.OT': 'Other Quantitative Biology',
+    'q-bio.PE': 'Populations and Evolution',
+    'q-bio.QM': 'Quantitative Methods',
+    'q-bio.SC': 'Subcellular Processes',
+    'q-bio.TO': 'Tissues and Organs',
+    'q-fin.CP': 'Computational Finance',
+    'q-fin.GN': 'General Finance',
+    'q-fin.MF': 'Mathematical Finance',
+    'q-fin.PM': 'Portfolio Management',
+    'q-fin.PR': 'Pricing of Securities',
+    'q-fin.RM': 'Risk Management',
+    'q-fin.ST': 'Statistical Finance',
+    'q-fin.TR': 'Trading and Market Microstructure',
+    'stat.AP': 'Applications',
+    'stat.CO': 'Computation',
+    'stat.ME': 'Methodology',
+    'stat.ML': 'Machine Learning',
+    'stat.OT': 'Other Statistics',
+    'eess.AS': 'Audio and Speech Processing',
+    'eess.IV': 'Image and Video Processing',
+    'eess.SP': 'Signal Processing',
+    'eess.SY': 'Systems and Control',
+    'econ.EM': 'Econometrics',
+    'econ.GN': 'General Economics',
+    'econ.TH': 'Theoretical Economics',
+}
 
+# Alias and pre-2000 archive codes -> the current code they were merged into
+arxiv_category_aliases = {
+    'math.IT': 'cs.IT',
+    'math.MP': 'math-ph',
+    'cs.NA': 'math.NA',
+    'cs.SY': 'eess.SY',
+    'stat.TH': 'math.ST',
+    'q-fin.EC': 'econ.GN',
+    'acc-phys': 'physics.acc-ph',
+    'adap-org': 'nlin.AO',
+    'alg-geom': 'math.AG',
+    'ao-sci': 'physics.ao-ph',
+    'atom-ph': 'physics.atom-ph',
+    'bayes-an': 'physics.data-an',
+    'chao-dyn': 'nlin.CD',
+    'chem-ph': 'physics.chem-ph',
+    'cmp-lg': 'cs.CL',
+    'comp-gas': 'nlin.CG',
+    'dg-ga': 'math.DG',
+    'funct-an': 'math.FA',
+    'mtrl-th': 'cond-mat.mtrl-sci',
+    'patt-sol': 'nlin.PS',
+    'plasm-ph': 'physics.plasm-ph',
+    'q-alg': 'math.QA',
+    'solv-int': 'nlin.SI',
+    'supr-con': 'cond-mat.supr-con',
+}
 
+def category_taxonomy_rows():
+    """Rows of category_taxonomy: (code, name, archive, archive_name, group_name, canonical_code).
 
+    Aliases repeat the hierarchy of the code they point at.
+    """
+    rows = {}
+    for code, name in arxiv_categories.items():
+        archive = code.split('.')[0]
+        archive_name, group_name = arxiv_archives[archive]
+        rows[code] = (code, name, archive, archive_name, group_name, code)
+    for alias, canonical in arxiv_category_aliases.items():
+        rows[alias] = (alias,) + rows[canonical][1:]
+    return list(rows.values())
+
+def load_category_taxonomy(cursor):
+    """Upsert the arXiv taxonomy into category_taxonomy; returns the number of rows changed."""
+    rows = category_taxonomy_rows()
+    psycopg2.extras.execute_values(cursor, """
+        INSERT INTO category_taxonomy (code, name, archive, archive_name, group_name, canonical_code)
+        VALUES %s
+        ON CONFLICT (code) DO UPDATE
+        SET name = EXCLUDED.name,
+            archive = EXCLUDED.archive,
+            archive_name = EXCLUDED.archive_name,
+            group_name = EXCLUDED.group_name,
+            canonical_code = EXCLUDED.canonical_code
+        WHERE (category_taxonomy.name, category_taxonomy.archive, category_taxonomy.archive_name,
+               category_taxonomy.group_name, category_taxonomy.canonical_code)
+              IS DISTINCT FROM
+              (EXCLUDED.name, EXCLUDED.archive, EXCLUDED.archive_name, EXCLUDED.group_name, EXCLUDED.canonical_code);
+    """, rows, page_size=len(rows))
+    return cursor.rowcount
+
+@instrumented_task
 def normalize_fields_of_study():
+    """Link every category code to the arXiv taxonomy.
+
+    category_name keeps the raw code, so id lookups by code are unaffected;
+    taxonomy_code points at the current taxonomy code, through which
+    categories roll up to their archive and group.
+    """
     try:
-        with psycopg2.connect(**db_params) as conn:
+        with db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT id, category_name FROM categories;")
-                for category_id, category_name in cursor.fetchall():
-                    normalized_category = map_to_normalized_category(category_name)
-
-                    update_query = """
-                        UPDATE categories 
-                        SET category_name = %s 
-                        WHERE id = %s;
-                    """
-                    cursor.execute(update_query, (normalized_category, category_id))
+                metrics.incr('category_taxonomy_rows_written', load_category_taxonomy(cursor))
+                cursor.execute("""
+                    UPDATE categories c
+                    SET taxonomy_code = t.canonical_code
+                    FROM category_taxonomy t
+                    WHERE t.code = c.category_name AND c.taxonomy_code IS DISTINCT FROM t.canonical_code;
+                """)
+                metrics.incr('categories_normalized', cursor.rowcount)
+
+                cursor.execute("SELECT category_name FROM categories WHERE taxonomy_code IS NULL ORDER BY category_name;")
+                unmapped = [category_name for category_name, in cursor.fetchall()]
+                if unmapped:
+                    logging.warning(f"{len(unmapped)} category codes are not in the arXiv taxonomy: {unmapped[:20]}")
                 conn.commit()
                 logging.info("Fields of study normalized successfully.")
     except Exception as e:
         logging.error(f"An error occurred during field of study normalization: {e}")
 
 
-def store_citation_data(cursor, publication_id, citations):
+# Publication year in a Scholar summary such as "A Author, B Author - Journal, 2019 - publisher"
+summary_year = re.compile(r'\b(1[89]\d\d|20\d\d)\b')
+
+def citation_rows(publication_id, citations):
+    rows = []
     for citation in citations:
-        title = citation.get('title', '').strip()
-        link = citation.get('link', '').strip()  # Remove this line if 'link' is not in your table
-        snippet = citation.get('snippet', '').strip()  # Remove this line if 'snippet' is not in your table
+        title = (citation.get('title') or '').strip()
 
         # Extract the first author from the summary, if available
         summary = citation.get('publication_info', {}).get('summary', '')
         author = summary.split('-')[0].strip() if '-' in summary else 'Unknown'
+        year = summary_year.search(summary.split(' - ', 1)[-1])
+
+        rows.append((publication_id, title, title_fingerprint(title), author, int(year.group(1)) if year else None))
+    return rows
+
+def store_citation_data(cursor, rows):
+    """Insert buffered citation rows with one multi-row statement."""
+    if rows:
+        psycopg2.extras.execute_values(cursor, """
+            INSERT INTO citations (publication_id, title, title_fingerprint, author, year) VALUES %s;
+        """, rows, template="(%s, %s, %s::uuid, %s, %s)", page_size=len(rows))
+        metrics.incr('citations_written', len(rows))
+
+@work_queue_stage('citations')
+def process_citation_items(cursor, items):
+    """Search Scholar for the claimed titles and store the citations found."""
+    all_results = query_google_scholar_many(title for _, title, _, _ in items)
+    rows = []
+    for (publication_id, title, _, _), response in zip(items, all_results):
+        if response and 'organic_results' in response:
+            rows.extend(citation_rows(publication_id, response['organic_results']))
+        else:
+            # The response is cached, so a retry would get the same answer: the item is done
+            logging.warning(f"No results or invalid response for title '{title}'")
+    for chunk in iter_batches(rows, enrichment_batch_size):
+        store_citation_data(cursor, chunk)
+    return {}
 
-        # Insert query for the citations table, adjusted to match your schema
-        insert_query = """
-            INSERT INTO citations (publication_id, title, author, year) 
-            VALUES (%s, %s, %s, %s)
-        """
-        cursor.execute(insert_query, (publication_id, title, author, None))  # 'None' for year as it's not extracted
-
-def query_and_store_citations():
+@instrumented_task
+def query_and_store_citations(workers=work_queue_workers, **context):
     try:
-        with psycopg2.connect(**db_params) as conn:
+        with db_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT id, title FROM publications;")
-                for publication_id, title in cursor.fetchall():
-                    response = query_google_scholar(title)
-                    if response and 'organic_results' in response:
-                        store_citation_data(cursor, publication_id, response['organic_results'])
-                    else:
-                        logging.warning(f"No results or invalid response for title '{title}'")
-                conn.commit()
-                logging.info("Citation data stored successfully.")
+                full_refresh = is_full_refresh(context)
+                # The watermark is the last publication queued, not the last one looked up
+                last_id = get_watermark(cursor, 'query_and_store_citations', full_refresh) or 0
+                pending = stream_rows("SELECT id FROM publications WHERE id > %s ORDER BY id;", (last_id,))
+                with pending as publications:
+                    for chunk in iter_batches(publications, work_queue_enqueue_batch_size):
+                        metrics.incr('publications_read', len(chunk))
+                        enqueue_work(cursor, 'citations', [publication_id for publication_id, in chunk], requeue=full_refresh)
+                        set_watermark(cursor, 'query_and_store_citations', chunk[-1][0])
+                        conn.commit()
+
+        looked_up, failed = run_work_queue('citations', workers)
+        get_scholar_cache().log_stats()
+        logging.info(f"Citation data stored successfully: {looked_up} publications looked up, {failed} failed.")
+        return {'looked_up': looked_up, 'failed': failed}
     except Exception as e:
         logging.error(f"An error occurred during citation data storage: {e}")
 
 
 
 
+### CITATION GRAPH
+
+# Citations resolved to publications per statement, as a range of citations.id
+citation_graph_batch_size = 50000
+# Largest distance precomputed in citation_neighbourhoods
+citation_max_hops = 2
+# Publications kept per publication and distance; hubs would otherwise pull in most of the graph
+citation_neighbourhood_limit = 1000
+
+def backfill_citation_fingerprints(cursor):
+    """Fingerprint the titles of citations stored before they were fingerprinted."""
+    filled = 0
+    with stream_rows("SELECT id, title FROM citations WHERE title_fingerprint IS NULL ORDER BY id;") as citations:
+        for chunk in iter_batches(citations, citation_graph_batch_size):
+            rows = [(citation_id, title_fingerprint(title)) for citation_id, title in chunk]
+            psycopg2.extras.execute_values(cursor, """
+                UPDATE citations c
+                SET title_fingerprint = v.title_fingerprint::uuid
+                FROM (VALUES %s) AS v (id, title_fingerprint)
+                WHERE c.id = v.id;
+            """, rows, page_size=len(rows))
+            filled += len(rows)
+    return filled
+
+def resolve_citation_edges(cursor, watermark):
+    """Turn citations whose title matches a publication into (publication_id, cited_id) edges.
+
+    publication_id is the citing publication found through the title
+    fingerprint index and cited_id the publication the citation was stored
+    for. New citations are matched against every publication, and new
+    publications against the citations matched before, so a paper loaded
+    after it was cited still gets its edges. Returns the number of edges
+    added and the new watermark.
+    """
+    cursor.execute("SELECT (SELECT COALESCE(MAX(id), 0) FROM citations), (SELECT COALESCE(MAX(id), 0) FROM publications);")
+    newest_citation_id, newest_publication_id = cursor.fetchone()
+    last_citation_id = watermark.get('citation_id', 0)
+    last_publication_id = watermark.get('publication_id', 0)
+
+    added = 0
+    for start in range(last_citation_id, newest_citation_id, citation_graph_batch_size):
+        cursor.execute("""
+            INSERT INTO citation_edges (publication_id, cited_id)
+            SELECT DISTINCT p.id, c.publication_id
+            FROM citations c
+            JOIN publications p ON p.title_fingerprint = c.title_fingerprint
+            WHERE c.id > %s AND c.id <= %s AND p.id <> c.publication_id
+            ORDER BY p.id, c.publication_id
+            ON CONFLICT DO NOTHING;
+        """, (start, min(start + citation_graph_batch_size, newest_citation_id)))
+        added += cursor.rowcount
+
+    cursor.execute("""
+        INSERT INTO citation_edges (publication_id, cited_id)
+        SELECT DISTINCT p.id, c.publication_id
+        FROM publications p
+        JOIN citations c ON c.title_fingerprint = p.title_fingerprint
+        WHERE p.id > %s AND p.id <= %s AND c.id <= %s AND p.id <> c.publication_id
+        ORDER BY p.id, c.publication_id
+        ON CONFLICT DO NOTHING;
+    """, (last_publication_id, newest_publication_id, last_citation_id))
+    added += cursor.rowcount
+    return added, {'citation_id': newest_citation_id, 'publication_id': newest_publication_id}
+
+def load_citation_graph():
+    """Read the edges into undirected adjacency arrays in CSR layout.
+
+    Returns (node_ids, offsets, targets): the neighbours of the publication
+    node_ids[i] are the node indexes targets[offsets[i]:offsets[i + 1]].
+    """
+    sources = array.array('i')
+    destinations = array.array('i')
+    with stream_rows("SELECT publication_id, cited_id FROM citation_edges;") as edges:
+        for publication_id, cited_id in edges:
+            sources.append(publication_id)
+            destinations.append(cited_id)
+    metrics.incr('citation_edges_read', len(sources))
+
+    node_ids = array.array('i', sorted(set(sources).union(destinations)))
+    position = {node_id: index for index, node_id in enumerate(node_ids)}
+    degrees = [0] * (len(node_ids) + 1)
+    for source, destination in zip(sources, destinations):
+        degrees[position[source] + 1] += 1
+        degrees[position[destination] + 1] += 1
+    offsets = array.array('i', itertools.accumulate(degrees))
+
+    targets = array.array('i', [0]) * offsets[-1]
+    fill = offsets[:-1]
+    for source, destination in zip(sources, destinations):
+        source, destination = position[source], position[destination]
+        targets[fill[source]] = destination
+        fill[source] += 1
+        targets[fill[destination]] = source
+        fill[destination] += 1
+    return node_ids, offsets, targets
+
+def citation_neighbourhoods(node_ids, offsets, targets, max_hops=citation_max_hops, limit=citation_neighbourhood_limit):
+    """Yield (publication_id, hops, neighbour_ids) for every publication and distance up to max_hops."""
+    for node in range(len(node_ids)):
+        seen = {node}
+        frontier = [node]
+        for hops in range(1, max_hops + 1):
+            reached = []
+            for current in frontier:
+                for neighbour in targets[offsets[current]:offsets[current + 1]]:
+                    if neighbour not in seen and len(reached) < limit:
+                        seen.add(neighbour)
+                        reached.append(neighbour)
+            if not reached:
+                break
+            yield node_ids[node], hops, sorted(node_ids[index] for index in reached)
+            frontier = reached
+
+def store_citation_neighbourhoods(cursor, neighbourhoods):
+    """Replace citation_neighbourhoods with COPY; returns the number of rows written."""
+    cursor.execute("TRUNCATE citation_neighbourhoods;")
+    written = 0
+    for chunk in iter_batches(neighbourhoods, citation_graph_batch_size):
+        copy_rows(cursor, 'citation_neighbourhoods', ('publication_id', 'hops', 'neighbour_ids'),
+                  ((publication_id, hops, '{' + ','.join(map(str, ids)) + '}') for publication_id, hops, ids in chunk))
+        written += len(chunk)
+    return written
+
+@instrumented_task
+def build_citation_graph(**context):
+    """Resolve stored citations into graph edges and precompute k-hop neighbourhoods.
+
+    In-degree and per-author h-index are materialized views over the edges,
+    rebuilt by refresh_reporting_views.
+    """
+    try:
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                full_refresh = is_full_refresh(context)
+                watermark = get_watermark(cursor, 'build_citation_graph', full_refresh) or {}
+                if full_refresh:
+                    cursor.execute("TRUNCATE citation_edges;")
+
+                filled = backfill_citation_fingerprints(cursor)
+                added, watermark = resolve_citation_edges(cursor, watermark)
+                set_watermark(cursor, 'build_citation_graph', watermark)
+                conn.commit()
+                metrics.incr('citation_edges_added', added)
+                logging.info(f"Added {added} citation edges ({filled} citation titles fingerprinted).")
+
+                with metrics.timer('citation_neighbourhoods_seconds'):
+                    graph = load_citation_graph()
+                    written = store_citation_neighbourhoods(cursor, citation_neighbourhoods(*graph))
+                conn.commit()
+                metrics.incr('citation_neighbourhoods_written', written)
+                logging.info(f"Stored {written} neighbourhoods of {len(graph[0])} publications.")
+                return {'edges_added': added, 'neighbourhoods': written}
+    except psycopg2.Error as e:
+        logging.error(f"Database error while building the citation graph: {e}")
+        raise
+
+
+
+
 
 
 ### DATA VALIDATION
@@ -522,9 +3213,10 @@ def validate_authors(cursor):
         raise
 
 
+@instrumented_task
 def validate_data():
     try:
-        with psycopg2.connect(**db_params) as conn:
+        with db_connection() as conn:
             with conn.cursor() as cursor:
                 validate_publications(cursor)
                 validate_authors(cursor)
@@ -536,6 +3228,40 @@ def validate_data():
 
 
 
+### REPORTING
+
+# Materialized summaries read by the dashboards, see the schema SQL
+reporting_views = (
+    'author_publication_counts',
+    'publication_citation_counts',
+    'category_publication_counts',
+    # Refreshed in this order: author_h_index reads publication_citation_degrees
+    'publication_citation_degrees',
+    'author_h_index',
+)
+
+@instrumented_task
+def refresh_reporting_views():
+    try:
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                timings = {}
+                for view in reporting_views:
+                    # CONCURRENTLY keeps the view readable while it is rebuilt
+                    started = time.monotonic()
+                    cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view};")
+                    conn.commit()
+                    timings[view] = round(time.monotonic() - started, 3)
+                    metrics.observe(f"refresh_{view}_seconds", timings[view])
+                    logging.info(f"Refreshed {view} in {timings[view]:.2f}s")
+                logging.info("Reporting views refreshed successfully.")
+                return timings
+    except psycopg2.Error as e:
+        logging.error(f"Database error while refreshing reporting views: {e}")
+        raise
+
+
+
 # DAG Definition
 default_args = {
     'owner': 'airflow',
@@ -552,6 +3278,12 @@ dag = DAG(
 )
 
 # Task Definitions
+stage_parquet_task = PythonOperator(
+    task_id='stage_parquet',
+    python_callable=stage_parquet,
+    dag=dag,
+)
+
 insert_data_task = PythonOperator(
     task_id='insert_data',
     python_callable=insert_data,
@@ -570,23 +3302,23 @@ enrich_publications_task = PythonOperator(
     dag=dag,
 )
 
-# resolve_publication_types_task = PythonOperator(
-#     task_id='resolve_publication_types',
-#     python_callable=resolve_publication_types,
-#     dag=dag,
-# )
+resolve_publication_types_task = PythonOperator(
+    task_id='resolve_publication_types',
+    python_callable=resolve_publication_types,
+    dag=dag,
+)
 
-# resolve_author_names_task = PythonOperator(
-#     task_id='resolve_author_names',
-#     python_callable=resolve_author_names,
-#     dag=dag,
-# )
+resolve_author_names_task = PythonOperator(
+    task_id='resolve_author_names',
+    python_callable=resolve_author_names,
+    dag=dag,
+)
 
-# normalize_fields_of_study_task = PythonOperator(
-#     task_id='normalize_fields_of_study',
-#     python_callable=normalize_fields_of_study,
-#     dag=dag,
-# )
+normalize_fields_of_study_task = PythonOperator(
+    task_id='normalize_fields_of_study',
+    python_callable=normalize_fields_of_study,
+    dag=dag,
+)
 
 query_and_store_citations_task = PythonOperator(
     task_id='query_and_store_citations',
@@ -594,19 +3326,36 @@ query_and_store_citations_task = PythonOperator(
     dag=dag,
 )
 
+build_citation_graph_task = PythonOperator(
+    task_id='build_citation_graph',
+    python_callable=build_citation_graph,
+    dag=dag,
+)
+
 validate_data_task = PythonOperator(
     task_id='validate_data',
     python_callable=validate_data,  # Now calls both validate_publications and validate_authors
     dag=dag,
 )
 
+refresh_reporting_views_task = PythonOperator(
+    task_id='refresh_reporting_views',
+    python_callable=refresh_reporting_views,
+    dag=dag,
+)
+
 
 
 # Task Dependencies
+stage_parquet_task >> insert_data_task
 insert_data_task >> clean_data_task
-clean_data_task >> enrich_publications_task
-# resolve_publication_types_task >> enrich_publications_task
-# resolve_author_names_task >> enrich_publications_task
-# normalize_fields_of_study_task >> enrich_publications_task
+clean_data_task >> resolve_author_names_task
+# Both look titles up on Scholar: run one after the other so each gets the whole API rate
+resolve_author_names_task >> resolve_publication_types_task
+resolve_publication_types_task >> enrich_publications_task
+clean_data_task >> normalize_fields_of_study_task
+normalize_fields_of_study_task >> enrich_publications_task
 enrich_publications_task >> query_and_store_citations_task
-query_and_store_citations_task >> validate_data_task
\ No newline at end of file
+query_and_store_citations_task >> build_citation_graph_task
+build_citation_graph_task >> validate_data_task
+validate_data_task >> refresh_reporting_views_task
\ No newline at end of file